@@ -9,6 +9,7 @@ import requests
 from habanero import Crossref
 import json
 import pandas as pd 
+import numpy as np
 from tei_reader import TeiReader
 from lxml import etree
 import string
@@ -19,108 +20,131 @@ import dateutil.parser
 import os.path
 import re
 import editdistance
+import time
+import hashlib
+import pickle
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import settings
+from cache import ResponseCache
+from store import TableStore
+from files import writeFileAtomic
+import instrumentation
 
 GROBID_API = os.getenv('GROBID_API')
+GROBID_MAX_RETRIES = 5 # Number of retries when GROBID is busy (HTTP 503)
+GROBID_RETRY_DELAY = 2 # Seconds to wait before the first retry, doubled for every next retry
+TEI = '{http://www.tei-c.org/ns/1.0}'
+NAMESPACES = {'tei': 'http://www.tei-c.org/ns/1.0'}
+XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+FULLTEXT_OPTIONS = {'includeRawCitations': 1, 'consolidateCitations': 1}
+CITATION_OPTIONS = {'consolidateCitations': 1}
 vocab = dict()
 cr = Crossref()
+cache = None # Cache for GROBID responses, disabled when None
+store = None # Typed intermediate store of the tables, disabled when None
+REFERENCE_INDEX_VERSION = 3 # Increase when the format of the references changes, so existing reference indexes are rebuilt
+referenceIndexes = {} # Reference indexes that are already loaded, by hash of the XML file
+EXTRACTION_VERSION = 2 # Increase when the way tables are processed changes, so all tables are processed again 
+FUZZY_CANDIDATES = 10 # Number of keys with the most trigrams in common that are compared when looking for a similar key
+
+# Bibliographical metadata columns that are added to each table
+METADATA_COLUMNS = ['title', 'authors', 'publicationMonth', 'publicationYear', 'doi', 'referenceRaw']
+
+# Stats for counting the results, each table has its own stats which are added up afterwards 
+def newStats():
+    return {
+        'papers': 0,
+        'foundReferences': 0,
+        'notFoundReferences': 0,
+        'cellsNoReferences': 0,
+        'cellsWithReferences': 0
+    }
+
+def mergeStats(stats, tableStats):
+    for key in tableStats:
+        stats[key] += tableStats[key]
 
-# Stats for counting the results 
-stats = {
-    'papers': 0,
-    'foundReferences': 0,
-    'notFoundReferences': 0,
-    'cellsNoReferences': 0,
-    'cellsWithReferences': 0
-}
+def main(argv=None):
+    args = parseArguments(argv)
+    instrumentation.printTableSummaries = args.metrics_summary
 
-def main():
     # Check if there is a data directory param, otherwise use the default './data' directory 
-    parser = argparse.ArgumentParser(description='Reference extractor')
-    parser.add_argument("--dir", default=None)
-    args = parser.parse_args()
     data_dir = args.dir
     data_dir = './data/' if not data_dir else data_dir
-    directory = os.fsencode(data_dir)
+    queueFile = data_dir + 'resolutionQueue.jsonl' if not args.queue else args.queue
+    manifestFile = data_dir + 'manifest.json' if not args.manifest else args.manifest
+
+    # Asking for missing references is not possible from multiple processes
+    if args.jobs > 1 and not args.non_interactive:
+        print(colored('Running with multiple jobs, missing references are added to the resolution queue', 'yellow'))
+        args.non_interactive = True
+
+    openCache(args)
+
+    if args.resolve_queue:
+        resolveQueue(data_dir, queueFile, args.citation_batch_size)
+        instrumentation.report(args)
+        return
+
+    resolutionQueue = loadResolutionQueue(queueFile)
+
+    # Parse all PDFs that are not parsed yet, before starting with the tables 
+    with instrumentation.timer('parsePapers'):
+        parsePapers(data_dir, args.grobid_workers)
+
+    # Collect the raw references of all tables first, so they can be parsed in batches
+    parsedCitations = {}
+    if args.batch_citations == 'all':
+        rawReferences = []
+
+        for filename, paperId in listTables(data_dir):
+            if os.path.exists(data_dir + 'parsedPaper-' + paperId + '.xml'):
+                references = loadReferenceIndex(data_dir, paperId)
+                df = pd.read_csv(data_dir + filename)
+
+                for rawReference in collectPendingCitations(df, references):
+                    if rawReference not in rawReferences:
+                        rawReferences.append(rawReference)
+
+        parsedCitations = parseCitations(rawReferences, args.citation_batch_size)
+
+    # Group the tables per paper, so tables from the same paper are processed by the same job and share the reference index
+    paperTables = {}
+    for filename, paperId in listTables(data_dir):
+        # Only continue if a PDF version of the paper is present
+        if os.path.exists(data_dir + paperId + '.pdf'):
+            paperTables.setdefault(paperId, []).append(filename)
+
+    stats = newStats()
+    manifest = loadManifest(manifestFile)
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=initWorker, initargs=(args,)) as executor:
+            # The metrics of the worker processes are collected per call and added to the metrics of this process
+            futures = [executor.submit(instrumentation.collect, processTables, data_dir, paperId, filenames, args, parsedCitations, manifest) for paperId, filenames in paperTables.items()]
+
+            for future in as_completed(futures):
+                results, metrics = future.result()
+                instrumentation.merge(metrics)
+
+                for filename, tableStats, unresolvedReferences, manifestEntry in results:
+                    mergeStats(stats, tableStats)
+                    manifest[filename] = manifestEntry
+                    updateResolutionQueue(resolutionQueue, filename, unresolvedReferences)
+    else:
+        for paperId, filenames in paperTables.items():
+            for filename, tableStats, unresolvedReferences, manifestEntry in processTables(data_dir, paperId, filenames, args, parsedCitations, manifest):
+                mergeStats(stats, tableStats)
+                manifest[filename] = manifestEntry
+                updateResolutionQueue(resolutionQueue, filename, unresolvedReferences)
 
+    saveManifest(manifestFile, manifest)
 
-    # Loop through each CSV file in the data directory
-    for file in os.listdir(directory):
-        filename = os.fsdecode(file)
-        if filename.endswith('.csv'): 
-            tableId = filename.replace('.csv', '')
-            paperId = tableId.split('.')[0]
-            #tableId = '.' + str(tableId)
-            paperFileName = str(paperId) + '.pdf'
-            
-            # Only continue if a PDF version of the paper is present
-            if os.path.exists(data_dir + paperFileName):
-                # In case the PDF hasn't been parsed by GROBID already, do that now
-                if not os.path.exists(data_dir + 'parsedPaper-' + str(paperId) + '.xml'):
-                    print('Parsing full paper with GROBID...')
-                    url = GROBID_API + '/processFulltextDocument'
-                    files = {
-                        'input': open(data_dir + paperFileName, 'rb'), 
-                        'includeRawCitations': 1, 
-                        'consolidateCitations': 1 
-                    }
-                
-                    # Save to a file for the parsed PDF XML can be used later 
-                    r = requests.post(url, files=files)
-                    referencesFile = open(data_dir + 'parsedPaper-' + str(paperId) + '.xml', 'w')
-                    referencesFile.write(r.text)
-                    referencesFile.close()
-                
-                # Open the PDF parsing results and load the tree
-                tree = etree.parse(data_dir + 'parsedPaper-' + str(paperId) + '.xml') 
-                references = loadReferences(tree)
-
-                print(colored('Select table: ' + filename, 'yellow'))
-
-                df = pd.read_csv(data_dir + filename) 
-                papers = df.iloc
-
-                # Lists for metadata that will be collected
-                titles = []
-                authors = []
-                publicationMonths = []
-                publicationYears = []
-                dois = []
-                referenceRaws = []
-
-                # Loop through all rows in the CSV file (each row is a paper)
-                for paper in papers:
-                    # Get the bibliographical metadata for each paper
-                    result = processPaper(paper, references, paperId)
-
-                    titles.append(result['title'])
-                    authors.append(result['author'])
-                    publicationMonths.append(result['publicationMonth'])
-                    publicationYears.append(result['publicationYear'])
-                    dois.append(result['doi'])
-                    referenceRaws.append(result['referenceRaw'])
-                
-                # Add the fetched metadata to the dataframe
-                if len(titles) > 0:
-                    df['title'] = titles
-                    df['authors'] = authors
-                    df['publicationMonth'] = publicationMonths
-                    df['publicationYear'] = publicationYears
-                    df['doi'] = dois
-                    df['referenceRaw'] = referenceRaws
-                
-                # Count the stats for the references
-                localCount = 0
-                localCountRefs = 0
-                for value in df.count(axis='columns'):
-                    localCount += value - 7 # Remove the bibliographical metadata, 6 columns plus the reference key itself
-                    localCountRefs += value - 1
-
-                stats['cellsNoReferences'] += localCount
-                stats['cellsWithReferences'] += localCountRefs
-                
-                # Save the new metadata 
-                df.to_csv(data_dir + filename, index=False)
+    if args.non_interactive:
+        saveResolutionQueue(queueFile, resolutionQueue)
+
+        if len(resolutionQueue) > 0:
+            print(colored(str(len(resolutionQueue)) + ' references are not found, add them with: python 4_reference_extraction.py --resolve-queue', 'yellow'))
     
     print('Found paper:', str(stats['papers']))
     print('Found references:', str(stats['foundReferences']))
@@ -128,52 +152,740 @@ def main():
     print('Total imported cells: ', str(stats['cellsNoReferences']))
     print('Total imported cells with references: ', str(stats['cellsWithReferences']))
 
-def processPaper(paper, references, paperId):
+    instrumentation.report(args)
+
+    return stats
+
+# Parse the command line options, known is True to ignore options of other scripts (used by run_pipeline.py)
+def parseArguments(argv=None, known=False):
+    parser = argparse.ArgumentParser(description='Reference extractor')
+    parser.add_argument("--dir", default=None)
+    parser.add_argument("--grobid-workers", type=int, default=4, help='Number of PDFs that are parsed by GROBID at the same time')
+    parser.add_argument("--batch-citations", choices=['none', 'table', 'all'], default='none', help='Parse missing raw references in batches per table or for all tables at once')
+    parser.add_argument("--citation-batch-size", type=int, default=50, help='Number of raw references that are sent to GROBID in a single request')
+    parser.add_argument("--cache-dir", default='./cache/', help='Directory of the GROBID response cache')
+    parser.add_argument("--cache-size", type=int, default=1024, help='Maximum size of the GROBID response cache in MB')
+    parser.add_argument("--no-cache", action='store_true', help='Always send requests to GROBID, without using the cache')
+    parser.add_argument("--non-interactive", action='store_true', help='Add references that are not found to the resolution queue instead of asking for them')
+    parser.add_argument("--queue", default=None, help='Resolution queue file (default: resolutionQueue.jsonl in the data directory)')
+    parser.add_argument("--resolve-queue", action='store_true', help='Ask for the raw references in the resolution queue and add them to the tables')
+    parser.add_argument("--jobs", type=int, default=1, help='Number of processes that process tables at the same time')
+    parser.add_argument("--manifest", default=None, help='Manifest file used to skip unchanged tables (default: manifest.json in the data directory)')
+    parser.add_argument("--force", action='store_true', help='Process all tables and rows, also when they have not changed')
+    parser.add_argument("--fuzzy", action='store_true', help='Match reference keys that are not found to similar keys generated from the references')
+    parser.add_argument("--fuzzy-threshold", type=float, default=0.85, help='Minimal similarity (between 0 and 1) of a key to be used as match')
+    parser.add_argument("--store", default=None, help='Also write the tables to this typed intermediate store (SQLite), which can be read by the graph builder')
+    parser.add_argument("--metrics", default=None, help='Write the timings and call counts of the stages to this file')
+    parser.add_argument("--metrics-format", choices=['json', 'prometheus'], default=None, help='Format of the metrics file (default: prometheus for .prom files, otherwise json)')
+    parser.add_argument("--metrics-summary", action='store_true', help='Print the timings and call counts of each table and of the whole run')
+
+    if known:
+        return parser.parse_known_args(argv)
+
+    return parser.parse_args(argv)
+
+# Open the GROBID response cache and the table store, this is also done once for every job since the connections can't be shared between processes 
+def openCache(args):
+    global cache, store
+    cache = None
+    store = None
+
+    if not args.no_cache:
+        cache = ResponseCache(os.path.join(args.cache_dir, 'grobid.sqlite'), args.cache_size * 1024 * 1024)
+
+    if args.store:
+        store = TableStore(args.store)
+
+# Set up a worker process of --jobs, the session of the parent is not used since its pooled connections are shared after forking
+def initWorker(args):
+    settings.reset_session()
+    openCache(args)
+
+# Process all tables of a paper, returns the stats, the references that are not found (None when the table is not processed) and the new manifest entry for each table
+def processTables(data_dir, paperId, filenames, args, parsedCitations, manifest):
+    results = []
+
+    for filename in filenames:
+        with instrumentation.table(tableId(filename)):
+            with instrumentation.timer('processTable'):
+                tableStats, unresolvedReferences, manifestEntry = processTable(data_dir, filename, paperId, args, parsedCitations, manifest.get(filename))
+        results.append((filename, tableStats, unresolvedReferences, manifestEntry))
+
+    return results
+
+# Add the bibliographical metadata to a single table
+# The manifest entry of the previous run is used to skip the table when nothing has changed, or otherwise to only process the changed rows
+def processTable(data_dir, filename, paperId, args, parsedCitations, manifestEntry=None):
+    stats = newStats()
+    unresolvedReferences = []
+
+    # Parsing the PDF has failed in the pre-pass, the table cannot be processed
+    if not os.path.exists(data_dir + 'parsedPaper-' + str(paperId) + '.xml'):
+        print(colored('Error: PDF ' + str(paperId) + '.pdf has not been parsed, skipping table ' + filename, 'red'))
+        return stats, None, manifestEntry
+
+    csvHash = fileHash(data_dir + filename)
+    xmlHash = fileHash(data_dir + 'parsedPaper-' + str(paperId) + '.xml')
+
+    # Results of the previous run can only be reused when the XML and the way tables are processed are the same
+    # Matching similar keys is part of the way tables are processed, so changing those settings processes the table again
+    fuzzySettings = args.fuzzy_threshold if args.fuzzy else None
+    if manifestEntry is not None and manifestEntry.get('fuzzy') != fuzzySettings:
+        manifestEntry = None
+
+    if args.force or manifestEntry is None or manifestEntry['version'] != EXTRACTION_VERSION or manifestEntry['xmlHash'] != xmlHash:
+        manifestEntry = None
+
+    # Tables that are not changed at all are skipped, unless some references could not be found last time or the table is not in the store yet
+    if manifestEntry is not None and manifestEntry['csvHash'] == csvHash and manifestEntry['unresolved'] == 0 and (store is None or store.hasTable(tableId(filename))):
+        print('Table unchanged: ' + filename)
+        return manifestEntry['stats'], unresolvedReferences, manifestEntry
+
+    previousRows = manifestEntry['rows'] if manifestEntry is not None else {}
+
+    # Load the references from the PDF parsing results
+    references = loadReferenceIndex(data_dir, paperId)
+
+    print(colored('Select table: ' + filename, 'yellow'))
+
+    df = pd.read_csv(data_dir + filename) 
+
+    if args.batch_citations == 'table':
+        parsedCitations = parseCitations(collectPendingCitations(df, references), args.citation_batch_size)
+
+    fuzzyIndex = buildFuzzyIndex(references, args.fuzzy_threshold) if args.fuzzy else None
+
+    # The metadata that will be collected, and the stats key that is counted for each row
+    metadata = pd.DataFrame('', index=df.index, columns=METADATA_COLUMNS, dtype=object)
+    outcomes = pd.Series('', index=df.index, dtype=object)
+    authorLists = pd.Series([[] for i in df.index], index=df.index, dtype=object)
+
+    # The reference of the row has not changed since the last run, so the metadata in the table is still correct
+    signatures = rowSignatures(df)
+    reused = signatures.isin(list(previousRows.keys()))
+
+    for column in METADATA_COLUMNS:
+        if column in df:
+            values = df.loc[reused, column]
+
+            # Years and months are read as floats when a column has empty cells, save them as whole numbers again
+            if pd.api.types.is_float_dtype(values) and (values.dropna() == values.dropna().round()).all():
+                values = values.astype('Int64')
+
+            metadata.loc[reused, column] = values.astype(object).where(values.notna(), '')
+
+    outcomes[reused] = signatures[reused].map(previousRows)
+
+    # The authors are joined with commas in the table, the lists of reused rows are taken from the store when possible
+    if store is not None and reused.any():
+        storedAuthors = store.loadAuthors(tableId(filename))
+
+        for row in np.flatnonzero(reused.to_numpy()):
+            authorLists.iloc[row] = storedAuthors.get(signatures.iloc[row], splitAuthors(metadata['authors'].iloc[row]))
+
+    # Look up the reference keys of all rows at once, rows with a matching key get the metadata from the paper
+    if 'Reference' in df:
+        with instrumentation.timer('matchReferences'):
+            found = resolveReferenceKeys(df).to_frame('key').join(referenceFrame(references), on='key')
+        matched = found['matched'].notna() & ~reused
+
+        metadata.loc[matched, METADATA_COLUMNS] = found.loc[matched, METADATA_COLUMNS]
+        authorLists[matched] = found.loc[matched, 'authorList']
+        outcomes[matched] = 'foundReferences'
+    else:
+        print(colored('Error: Column Reference not found!', 'red'))
+        matched = pd.Series(False, index=df.index)
+
+    stats['papers'] += int(reused.sum() + matched.sum())
+    for outcome, count in outcomes[reused | matched].value_counts().items():
+        if outcome != '':
+            stats[outcome] += int(count)
+
+    # The remaining rows are not found in the paper, they are processed one by one (using the raw reference or manual input)
+    for row in np.flatnonzero(~(reused | matched).to_numpy()):
+        paper = df.iloc[row]
+        with instrumentation.timer('processPaper'):
+            result = processPaper(paper, references, paperId, stats, parsedCitations, not args.non_interactive, fuzzyIndex)
+
+        metadata.iloc[row] = [result['title'], result['author'], result['publicationMonth'], result['publicationYear'], result['doi'], result['referenceRaw']]
+        authorLists.iloc[row] = result['authors']
+
+        if result['unresolved']:
+            unresolvedReferences.append({'table': filename, 'row': int(row), 'key': str(result['referenceKey']), 'paperId': paperId})
+            outcomes.iloc[row] = 'unresolved'
+        # A raw reference without metadata (e.g. typed in at the prompt) is parsed by the next run, so the row is not done yet
+        elif result['outcome'] == 'notFoundReferences' and hasRawReference(result) and hasMissingMetadata(result):
+            outcomes.iloc[row] = 'unresolved'
+        else:
+            outcomes.iloc[row] = result['outcome']
+    
+    # Add the fetched metadata to the dataframe
+    if len(df) > 0:
+        for column in METADATA_COLUMNS:
+            df[column] = metadata[column]
+    
+    # Count the stats for the references
+    counts = df.count(axis='columns')
+    stats['cellsNoReferences'] += int((counts - 7).sum()) # Remove the bibliographical metadata, 6 columns plus the reference key itself
+    stats['cellsWithReferences'] += int((counts - 1).sum())
+    
+    # Save the new metadata 
+    df.to_csv(data_dir + filename, index=False)
+
+    # Remember the saved table, the rows are read again so their signatures match those of the next run
+    savedSignatures = rowSignatures(pd.read_csv(data_dir + filename))
+    rows = {}
+    for signature, outcome in zip(savedSignatures, outcomes):
+        if outcome != 'unresolved':
+            rows[signature] = outcome
+
+    if store is not None:
+        store.saveTable(tableId(filename), paperId, df, authorLists.to_numpy(), savedSignatures.to_numpy())
+
+    manifestEntry = {
+        'version': EXTRACTION_VERSION,
+        'csvHash': fileHash(data_dir + filename),
+        'xmlHash': xmlHash,
+        'fuzzy': fuzzySettings,
+        'unresolved': int((outcomes == 'unresolved').sum()),
+        'stats': stats,
+        'rows': rows
+    }
+
+    return stats, unresolvedReferences, manifestEntry
+
+# The ID of a table in the store is the filename without extension (e.g. 'paper1.2'), the same as the tableID in the settings
+def tableId(filename):
+    return filename[:-len('.csv')]
+
+# Split the authors of a table cell, for tables that were processed without a store
+def splitAuthors(authors):
+    if not isinstance(authors, str) or authors == '':
+        return []
+
+    return [author.strip() for author in authors.split(',') if author.strip() != '']
+
+# The manifest contains per table the hashes of the processed CSV and XML files and the signatures of the processed rows
+def loadManifest(manifestFile):
+    if os.path.exists(manifestFile):
+        with open(manifestFile, encoding='utf-8') as f:
+            return json.load(f)
+
+    return {}
+
+def saveManifest(manifestFile, manifest):
+    writeFileAtomic(manifestFile, json.dumps(manifest, indent=2))
+
+def fileHash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+# The signature of a row consists of the cells that determine which reference is added, all rows are hashed at once
+def rowSignatures(df):
+    cells = pd.DataFrame(index=df.index)
+
+    for column in ['Reference', 'Year', 'referenceRaw']:
+        if column in df:
+            cells[column] = df[column].astype(str).where(df[column].notna(), '')
+        else:
+            cells[column] = ''
+
+    return pd.util.hash_pandas_object(cells, index=False).astype(str)
+
+# Clean the reference keys of all rows at once, the same way as resolveReferenceKey does for a single row
+# Keys are returned as strings, rows without a reference key get NaN
+def resolveReferenceKeys(df):
+    references = df['Reference']
+
+    if pd.api.types.is_numeric_dtype(references):
+        # Numeric citation keys, only whole numbers can match a citation number
+        wholeNumbers = references[references.notna() & (references == references.round())]
+        keys = wholeNumbers.astype('int64').astype(str).reindex(df.index)
+    else:
+        keys = references.astype(str).str.replace('[^0-9a-zA-Z]+', '', regex=True).str.lower().where(references.notna())
+
+        # If numeric citation key, remove leading zeros like casting to int does
+        numeric = keys.str.isdigit().fillna(False).astype(bool)
+        keys[numeric] = keys[numeric].str.lstrip('0').replace('', '0')
+
+    # If the reference key is not numeric (so author name reference), and the year is not present, and a year column exists => append year to key
+    if 'Year' in df:
+        year = df['Year']
+
+        if pd.api.types.is_float_dtype(year):
+            year = year.dropna().astype('int64').astype(str).reindex(df.index, fill_value='nan')
+        else:
+            year = year.astype(str)
+
+        withoutYear = keys.notna() & ~keys.str.contains(r'\d', regex=True).fillna(True).astype(bool)
+        keys[withoutYear] = keys[withoutYear] + year[withoutYear]
+
+    return keys
+
+# Build a dataframe from the references of a paper, indexed by the citation key as string, to look up all rows of a table at once
+def referenceFrame(references):
+    records = []
+    keys = []
+    seenKeys = set()
+
+    for citationKey, reference in references.items():
+        if str(citationKey) in seenKeys:
+            continue
+
+        seenKeys.add(str(citationKey))
+        keys.append(str(citationKey))
+        records.append({
+            'title': reference['title'],
+            'authors': ",".join(reference['authors']) if len(reference['authors']) > 0 else '',
+            'publicationMonth': reference['publicationMonth'],
+            'publicationYear': reference['publicationYear'],
+            'doi': reference['doi'],
+            'referenceRaw': reference['referenceRaw'],
+            'authorList': list(reference['authors']),
+            'matched': True
+        })
+
+    return pd.DataFrame(records, index=keys, columns=METADATA_COLUMNS + ['authorList', 'matched'], dtype=object)
+
+# List the CSV files in the data directory, together with the ID of the paper the table is from (e.g. table 'paper1.2.csv' is from paper 'paper1')
+def listTables(data_dir):
+    tables = []
+
+    for file in os.listdir(os.fsencode(data_dir)):
+        filename = os.fsdecode(file)
+        if filename.endswith('.csv'): 
+            tableId = filename.replace('.csv', '')
+            tables.append((filename, tableId.split('.')[0]))
+
+    return tables
+
+# Find all papers that have a PDF but no GROBID results yet, and parse them with a pool of workers 
+def parsePapers(data_dir, workers):
+    paperIds = []
+
+    for filename, paperId in listTables(data_dir):
+        if paperId in paperIds:
+            continue
+
+        if os.path.exists(data_dir + paperId + '.pdf') and not os.path.exists(data_dir + 'parsedPaper-' + paperId + '.xml'):
+            paperIds.append(paperId)
+
+    if len(paperIds) == 0:
+        return
+
+    print('Parsing ' + str(len(paperIds)) + ' full papers with GROBID...')
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(parsePaper, data_dir, paperId): paperId for paperId in paperIds}
+
+        for future in as_completed(futures):
+            paperId = futures[future]
+            try:
+                future.result()
+                print('Parsed paper ' + paperId + '.pdf')
+            except Exception as e:
+                print(colored('Error: parsing ' + paperId + '.pdf failed (' + str(e) + ')', 'red'))
+
+# Parse a single PDF with GROBID and save the XML, so the parsed PDF can be used later 
+def parsePaper(data_dir, paperId):
+    with open(data_dir + paperId + '.pdf', 'rb') as pdfFile:
+        pdf = pdfFile.read()
+
+    # The cache is based on the content of the PDF, so renamed or duplicated PDFs are only parsed once
+    cacheKey = ResponseCache.key('/processFulltextDocument', FULLTEXT_OPTIONS, pdf)
+    parsedPaper = getCachedResponse(cacheKey)
+
+    if parsedPaper is None:
+        files = {
+            'input': (paperId + '.pdf', pdf), 
+            'includeRawCitations': FULLTEXT_OPTIONS['includeRawCitations'], 
+            'consolidateCitations': FULLTEXT_OPTIONS['consolidateCitations'] 
+        }
+
+        r = grobidPost('/processFulltextDocument', files=files)
+
+        if r.status_code != 200:
+            raise Exception('GROBID returned HTTP ' + str(r.status_code))
+
+        parsedPaper = r.text
+
+        if cache is not None:
+            cache.set(cacheKey, parsedPaper)
+
+    writeFileAtomic(data_dir + 'parsedPaper-' + paperId + '.xml', parsedPaper)
+
+# Post a request to GROBID, when GROBID is busy (HTTP 503) wait and try again with an increasing delay
+def grobidPost(endpoint, **kwargs):
+    url = GROBID_API + endpoint
+
+    for attempt in range(GROBID_MAX_RETRIES + 1):
+        # Every request is counted per endpoint, e.g. 'grobid/processFulltextDocument'
+        with instrumentation.timer('grobid' + endpoint):
+            r = settings.init_session().post(url, **kwargs)
+
+        if r.status_code != 503 or attempt == GROBID_MAX_RETRIES:
+            break
+
+        instrumentation.count('grobid.retries')
+
+        time.sleep(GROBID_RETRY_DELAY * 2 ** attempt)
+
+    return r
+
+# Get a GROBID response from the cache, returns None when it is not cached (or the cache is disabled)
+def getCachedResponse(cacheKey):
+    if cache is None:
+        return None
+
+    response = cache.get(cacheKey)
+    instrumentation.count('grobidCache.hit' if response is not None else 'grobidCache.miss')
+
+    return response
+
+# Get the raw references of all rows in a table that are not found in the paper and still have to be parsed by GROBID
+def collectPendingCitations(df, references):
+    if 'Reference' not in df or 'referenceRaw' not in df:
+        return []
+
+    notFound = ~resolveReferenceKeys(df).isin([str(citationKey) for citationKey in references])
+    rawReference = df['referenceRaw']
+    hasRaw = rawReference.notna() & (rawReference != '') & (rawReference != 'none')
+
+    if 'title' in df:
+        missingMetadata = df['title'].isna() | (df['title'].astype(str) == '')
+    else:
+        missingMetadata = pd.Series(True, index=df.index)
+
+    return list(rawReference[notFound & hasRaw & missingMetadata].unique())
+
+# Parse a list of raw references with GROBID, multiple references are sent per request
+# Returns a dict with the raw reference as key and the parsed reference as value
+def parseCitations(rawReferences, batchSize):
+    parsedCitations = {}
+    batchSize = max(1, batchSize)
+
+    # Only the references that are not cached yet have to be sent to GROBID
+    uncachedReferences = []
+    for rawReference in rawReferences:
+        parsedCitation = getCachedResponse(ResponseCache.key('/processCitation', CITATION_OPTIONS, rawReference))
+
+        if parsedCitation is not None:
+            parsedCitations[rawReference] = loadReferenceFromString(parsedCitation)
+        else:
+            uncachedReferences.append(rawReference)
+
+    for start in range(0, len(uncachedReferences), batchSize):
+        batch = uncachedReferences[start:start + batchSize]
+        print('Parsing ' + str(len(batch)) + ' missing references using GROBID...')
+
+        r = grobidPost('/processCitationList', data={'citations': batch, 'consolidateCitations': CITATION_OPTIONS['consolidateCitations']})
+
+        if r.status_code != 200:
+            print(colored('Error: GROBID returned HTTP ' + str(r.status_code) + ' for a batch of references', 'red'))
+            continue
+
+        parsedBatch = splitReferenceList(r.content)
+
+        # The results can only be mapped back to the raw references when GROBID returns them all in the same order
+        if len(parsedBatch) != len(batch):
+            print(colored('Error: GROBID returned ' + str(len(parsedBatch)) + ' references for a batch of ' + str(len(batch)), 'red'))
+            continue
+
+        for rawReference, parsedCitation in zip(batch, parsedBatch):
+            if cache is not None:
+                cache.set(ResponseCache.key('/processCitation', CITATION_OPTIONS, rawReference), parsedCitation)
+
+            parsedCitations[rawReference] = loadReferenceFromString(parsedCitation)
+
+    return parsedCitations
+
+# Parse a single raw reference with GROBID, or get it from the cache when it has been parsed before
+def parseCitation(rawReference):
+    cacheKey = ResponseCache.key('/processCitation', CITATION_OPTIONS, rawReference)
+    parsedCitation = getCachedResponse(cacheKey)
+
+    if parsedCitation is None:
+        print('Parsing missing references using GROBID...')
+        files = {'citations': rawReference, 'consolidateCitations': CITATION_OPTIONS['consolidateCitations']}
+        
+        r = grobidPost('/processCitation', data=files)
+        parsedCitation = r.text
+
+        if cache is not None and r.status_code == 200:
+            cache.set(cacheKey, parsedCitation)
+
+    return loadReferenceFromString(parsedCitation)
+
+# Clean the reference key of a paper and append the year in case of an author name reference key
+def resolveReferenceKey(paper):
+    paper['Reference'] = cleanReferenceKey(paper['Reference'])
+    
+    # If numeric citation key, cast to int
+    if str(paper['Reference']).isdigit():
+        paper['Reference'] = int(paper['Reference'])
+
+    referenceKey = paper['Reference']
+    
+    # If the reference key is not numeric (so author name reference), and the year is not present, and a year column exists => append year to key
+    if not bool(re.search(r'\d', str(referenceKey))):
+        if 'Year' in paper:
+            year = paper['Year']
+
+            if year == year and isinstance(year , float):
+                year = int(year)
+
+            referenceKey = str(referenceKey) + str(year)
+
+    return referenceKey
+
+# A raw reference can be used in case the reference key is not found in the paper
+def hasRawReference(paper):
+    return 'referenceRaw' in paper and paper['referenceRaw'] != '' and paper['referenceRaw'] != 'none' and paper['referenceRaw'] == paper['referenceRaw']
+
+# The bibliographical data doesn't exist yet
+def hasMissingMetadata(paper):
+    return 'title' not in paper or str(paper['title']) == '' or paper['title'] != paper['title']
+
+# Ask the user for a raw reference, which can span multiple lines (an empty line ends the input)
+def readRawReference():
+    inputRawReference = []
+    while True:
+        line = input()
+        if line:
+            inputRawReference.append(line)
+        else:
+            break
+
+    return ' '.join(inputRawReference)
+
+# The resolution queue contains the references that are not found when running without user interaction 
+# Each line is a JSON object with the table, row, reference key and (once it is known) the raw reference
+def loadResolutionQueue(queueFile):
+    resolutionQueue = []
+
+    if os.path.exists(queueFile):
+        with open(queueFile, encoding='utf-8') as f:
+            for line in f:
+                if line.strip() != '':
+                    resolutionQueue.append(json.loads(line))
+
+    return resolutionQueue
+
+def saveResolutionQueue(queueFile, resolutionQueue):
+    writeFileAtomic(queueFile, ''.join(json.dumps(entry) + '\n' for entry in resolutionQueue))
+
+def addToResolutionQueue(resolutionQueue, entry):
+    for queuedEntry in resolutionQueue:
+        if queuedEntry['table'] == entry['table'] and queuedEntry['row'] == entry['row'] and queuedEntry['key'] == entry['key']:
+            return
+
+    entry['referenceRaw'] = ''
+    resolutionQueue.append(entry)
+
+# Replace the queued entries of a processed table by the references of the table that are still not found
+# Raw references that are already filled in the queue file are kept, unresolvedReferences is None when the table is not processed
+def updateResolutionQueue(resolutionQueue, filename, unresolvedReferences):
+    if unresolvedReferences is None:
+        return
+
+    queuedEntries = {(entry['row'], entry['key']): entry for entry in resolutionQueue if entry['table'] == filename}
+    resolutionQueue[:] = [entry for entry in resolutionQueue if entry['table'] != filename]
+
+    for entry in unresolvedReferences:
+        addToResolutionQueue(resolutionQueue, entry)
+
+        if (entry['row'], entry['key']) in queuedEntries:
+            entry['referenceRaw'] = queuedEntries[(entry['row'], entry['key'])]['referenceRaw']
+
+# Ask for all raw references in the resolution queue, parse them in batches and add them to the tables
+# Raw references can also be added by editing the queue file, and 'none' can be used for rows without a reference 
+def resolveQueue(data_dir, queueFile, batchSize):
+    resolutionQueue = loadResolutionQueue(queueFile)
+
+    if len(resolutionQueue) == 0:
+        print('The resolution queue is empty')
+        return
+
+    for entry in resolutionQueue:
+        if entry['referenceRaw'] == '':
+            print(colored('Reference ' + entry['key'] + ' not found (Table: ' + entry['table'] + ', row: ' + str(entry['row'] + 1) + '), please add manually the raw reference...', 'yellow'))
+            entry['referenceRaw'] = readRawReference()
+
+    rawReferences = []
+    for entry in resolutionQueue:
+        if entry['referenceRaw'] not in ['', 'none'] and entry['referenceRaw'] not in rawReferences:
+            rawReferences.append(entry['referenceRaw'])
+
+    parsedCitations = parseCitations(rawReferences, batchSize)
+    remainingQueue = []
+
+    for filename in sorted(set(entry['table'] for entry in resolutionQueue)):
+        entries = [entry for entry in resolutionQueue if entry['table'] == filename]
+
+        if not os.path.exists(data_dir + filename):
+            print(colored('Error: table ' + filename + ' not found', 'red'))
+            remainingQueue.extend(entries)
+            continue
+
+        df = pd.read_csv(data_dir + filename)
+        tableChanged = False
+
+        for column in ['title', 'authors', 'publicationMonth', 'publicationYear', 'doi', 'referenceRaw']:
+            if column not in df:
+                df[column] = ''
+            df[column] = df[column].astype(object)
+
+        # The author lists of the store are kept for the other rows, so the table can be saved in the store again
+        authorLists = None
+        if store is not None:
+            storedAuthors = store.loadAuthors(tableId(filename))
+            authorLists = [storedAuthors.get(signature, splitAuthors(authors)) for signature, authors in zip(rowSignatures(df), df['authors'])]
+
+        for entry in entries:
+            # Make sure the row still belongs to the same reference, in case the table has been changed in the meantime
+            if entry['row'] >= len(df) or 'Reference' not in df or str(resolveReferenceKey(df.iloc[entry['row']].copy())) != entry['key']:
+                print(colored('Error: row ' + str(entry['row'] + 1) + ' of table ' + filename + ' has changed, reference ' + entry['key'] + ' is skipped', 'red'))
+                remainingQueue.append(entry)
+            elif entry['referenceRaw'] == 'none':
+                df.at[entry['row'], 'referenceRaw'] = 'none'
+                tableChanged = True
+            elif entry['referenceRaw'] in parsedCitations:
+                parsedRef = parsedCitations[entry['referenceRaw']]
+                df.at[entry['row'], 'title'] = parsedRef['title']
+                df.at[entry['row'], 'authors'] = ",".join(parsedRef['authors'])
+                df.at[entry['row'], 'publicationMonth'] = parsedRef['publicationMonth']
+                df.at[entry['row'], 'publicationYear'] = parsedRef['publicationYear']
+                df.at[entry['row'], 'doi'] = parsedRef['doi']
+                df.at[entry['row'], 'referenceRaw'] = entry['referenceRaw']
+                tableChanged = True
+
+                if authorLists is not None:
+                    authorLists[entry['row']] = parsedRef['authors']
+            else:
+                remainingQueue.append(entry)
+
+        if tableChanged:
+            df.to_csv(data_dir + filename, index=False)
+
+            # The rows are read again so their signatures match those of the next run, as in processTable
+            if store is not None:
+                store.saveTable(tableId(filename), tableId(filename).split('.')[0], df, authorLists, rowSignatures(pd.read_csv(data_dir + filename)).to_numpy())
+
+    saveResolutionQueue(queueFile, remainingQueue)
+    print('Resolved references:', str(len(resolutionQueue) - len(remainingQueue)))
+    print('Remaining references in the queue:', str(len(remainingQueue)))
+
+# Build an index over the automatically generated keys (last name of the first author and the year) of the references
+# Keys are grouped per year and indexed by their trigrams, so only keys from the same year with trigrams in common are compared
+def buildFuzzyIndex(references, threshold):
+    fuzzyIndex = {
+        'threshold': threshold,
+        'years': {}
+    }
+
+    for citationKey, reference in references.items():
+        generatedKey = str(reference['generatedKey'])
+        year = str(reference['publicationYear'])
+
+        if year == '' or not generatedKey.endswith(year) or len(generatedKey) == len(year):
+            continue
+
+        name = generatedKey[:-len(year)]
+        names = [name]
+
+        # Tables often only mention the first author of papers with more than two authors
+        if name.endswith('etal') and len(name) > 4:
+            names.append(name[:-4])
+
+        yearIndex = fuzzyIndex['years'].setdefault(year, {'candidates': [], 'trigrams': {}})
+
+        for candidateName in names:
+            candidateId = len(yearIndex['candidates'])
+            yearIndex['candidates'].append((candidateName, citationKey, reference['authorCount']))
+
+            for trigram in getTrigrams(candidateName):
+                yearIndex['trigrams'].setdefault(trigram, set()).add(candidateId)
+
+    return fuzzyIndex
+
+def getTrigrams(text):
+    text = '  ' + text + ' '
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+# Find the references with a key similar to an author name reference key, ranked by their similarity score (between 0 and 1)
+# Only references from the same year, and with more than two authors in case the key contains 'et al.', are candidates
+def findFuzzyMatches(referenceKey, fuzzyIndex):
+    match = re.match(r'^([a-z]+)(\d{4})[a-z]?$', str(referenceKey))
+
+    if match is None:
+        return []
+
+    name, year = match.groups()
+    yearIndex = fuzzyIndex['years'].get(year)
+
+    if yearIndex is None:
+        return []
+
+    sharedTrigrams = {}
+    for trigram in getTrigrams(name):
+        for candidateId in yearIndex['trigrams'].get(trigram, ()):
+            sharedTrigrams[candidateId] = sharedTrigrams.get(candidateId, 0) + 1
+
+    scores = {}
+    for candidateId, shared in sorted(sharedTrigrams.items(), key=lambda item: -item[1])[:FUZZY_CANDIDATES]:
+        candidateName, citationKey, authorCount = yearIndex['candidates'][candidateId]
+
+        if name.endswith('etal') and authorCount < 3:
+            continue
+
+        score = 1 - editdistance.eval(name, candidateName) / max(len(name), len(candidateName))
+
+        if score >= fuzzyIndex['threshold'] and score > scores.get(citationKey, 0):
+            scores[citationKey] = score
+
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+# Get the key of the most similar reference, only when there is a single best match
+def findFuzzyMatch(referenceKey, fuzzyIndex):
+    candidates = findFuzzyMatches(referenceKey, fuzzyIndex)
+
+    if len(candidates) == 0 or (len(candidates) > 1 and candidates[0][1] == candidates[1][1]):
+        return None
+
+    return candidates[0]
+
+def processPaper(paper, references, paperId, stats, parsedCitations=None, interactive=True, fuzzyIndex=None):
     stats['papers'] += 1
     insertPaper = {}
     title = ''
     author = ''
+    authors = [] # The authors as list, the author names can contain commas
     publicationMonth = ''
     publicationYear = ''
     doi = ''
     referenceRaw = ''
+    referenceKey = ''
+    unresolved = False
+    outcome = '' # The stats key that is counted for this paper, used when the row is reused in the next run
     
     # If a column with a reference exists
     if 'Reference' in paper: 
-        paper['Reference'] = cleanReferenceKey(paper['Reference'])
-        
-        # If numeric citation key, cast to int
-        if str(paper['Reference']).isdigit():
-            paper['Reference'] = int(paper['Reference'])
+        referenceKey = resolveReferenceKey(paper)
 
-        referenceKey = paper['Reference']
-        
-        # If the reference key is not numeric (so author name reference), and the year is not present, and a year column exists => append year to key
-        if not bool(re.search(r'\d', str(referenceKey))):
-            if 'Year' in paper:
-                year = paper['Year']
-
-                if year == year and isinstance(year , float):
-                    year = int(year)
-
-                referenceKey = str(referenceKey) + str(year)
-
-        '''
-        # Editdistance for reference keys has been disabled because there were too many reference keys that only 
-        # differ one letter and are not the same
-        # If the citation key is not found, and not numeric key, use the edit distance to find keys that are similar  
-        if referenceKey not in references and not str(paper['Reference']).isdigit():
-            for reference in references:
-                distance = editdistance.eval(str(referenceKey), str(reference))
-                
-                if distance != 0 and distance <= 2:
-                    referenceKey = reference
-        '''
+        # If the citation key is not found, and no raw reference is provided, use a similar key generated from the references
+        # Only when enabled, since there are reference keys that differ only one letter and are not the same
+        if referenceKey not in references and fuzzyIndex is not None and not hasRawReference(paper) and not ('referenceRaw' in paper and paper['referenceRaw'] == 'none'):
+            fuzzyMatch = findFuzzyMatch(referenceKey, fuzzyIndex)
+
+            if fuzzyMatch is not None:
+                print(colored('Reference ' + str(referenceKey) + ' matched to ' + str(fuzzyMatch[0]) + ' (confidence: ' + str(round(fuzzyMatch[1], 2)) + ')', 'yellow'))
+                referenceKey = fuzzyMatch[0]
 
        # If a matching key has been found 
         if referenceKey in references:
             title = references[referenceKey]['title']
             author = references[referenceKey]['authors']
+            authors = list(author)
 
             if len(author) > 0:
                 author = ",".join(author)
@@ -186,20 +898,20 @@ def processPaper(paper, references, paperId):
             referenceRaw = references[referenceKey]['referenceRaw']
         
             stats['foundReferences'] += 1
+            outcome = 'foundReferences'
         # No matching key has been found, but there is a referenceRaw column present
-        elif 'referenceRaw' in paper and paper['referenceRaw'] != '' and paper['referenceRaw'] != 'none' and paper['referenceRaw'] == paper['referenceRaw']:
+        elif hasRawReference(paper):
             # When the bibliographical data doesn't exist yet
-            if 'title' not in paper or str(paper['title']) == '' or paper['title'] != paper['title']:
-                print('Parsing missing references using GROBID...')
-                url = GROBID_API + '/processCitation'
-                files = {'citations': paper['referenceRaw'], 'consolidateCitations': 1}
-                
-                r = requests.post(url, data=files)
-
-                parsedRef = loadReferenceFromString(r.text)
+            if hasMissingMetadata(paper):
+                # The reference might already be parsed in a batch
+                if parsedCitations and paper['referenceRaw'] in parsedCitations:
+                    parsedRef = parsedCitations[paper['referenceRaw']]
+                else:
+                    parsedRef = parseCitation(paper['referenceRaw'])
 
                 title = parsedRef['title']
                 author = parsedRef['authors']
+                authors = list(author)
 
                 if len(author) > 0:
                     author = ",".join(author)
@@ -211,34 +923,37 @@ def processPaper(paper, references, paperId):
                 publicationYear = parsedRef['publicationYear']
                 referenceRaw = paper['referenceRaw']
                 stats['notFoundReferences'] += 1
+                outcome = 'notFoundReferences'
             # Metadata already exists, make sure to use it 
             else:
                 stats['notFoundReferences'] += 1
+                outcome = 'notFoundReferences'
                 title = paper['title']
                 doi = paper['doi']
                 publicationMonth = paper['publicationMonth']
                 publicationYear = paper['publicationYear']
                 author = paper['authors']
+                authors = splitAuthors(author)
                 referenceRaw = paper['referenceRaw']
         # No reference and no raw reference has been found, ask user to manually supply it  
+        # Without user interaction, the reference is added to the resolution queue instead
         elif paper['referenceRaw'] != 'none':
-            print(colored('Reference ' + str(referenceKey) + ' not found (Paper: ' + str(paperId) + '.pdf), please add manually the raw reference...', 'yellow'))
             stats['notFoundReferences'] += 1
+            outcome = 'notFoundReferences'
 
-            # Get multiple input lines 
-            inputRawReference = []
-            while True:
-                line = input()
-                if line:
-                    inputRawReference.append(line)
-                else:
-                    break
+            if interactive:
+                print(colored('Reference ' + str(referenceKey) + ' not found (Paper: ' + str(paperId) + '.pdf), please add manually the raw reference...', 'yellow'))
 
-            inputRawReference = ' '.join(inputRawReference)
+                # Get multiple input lines 
+                inputRawReference = readRawReference()
 
-            if inputRawReference != '':
-                print('Saved!')
-                referenceRaw = inputRawReference
+                if inputRawReference != '':
+                    print('Saved!')
+                    referenceRaw = inputRawReference
+                else:
+                    unresolved = True
+            else:
+                unresolved = True
         else:
             referenceRaw = paper['referenceRaw']
     else:
@@ -247,29 +962,26 @@ def processPaper(paper, references, paperId):
     return {
         'title': title,
         'author': author,
+        'authors': authors,
         'publicationMonth': publicationMonth,
         'publicationYear': publicationYear,
         'doi':doi,
-        'referenceRaw': referenceRaw
+        'referenceRaw': referenceRaw,
+        'referenceKey': referenceKey,
+        'unresolved': unresolved,
+        'outcome': outcome
     }
 
-# Build a dict for connecting a internal reference ID with the actual reference number used in the paper
-# Do this by finding <ref type="bibr" target="#INTERNAL_ID">ACTUAL_CITATION_NUMBER</ref> from the parsed PDF
-def internalIdToCitation(tree):
+# Add the reference number used in the paper for an internal reference ID to the dict of citation numbers 
+# Do this by using <ref type="bibr" target="#INTERNAL_ID">ACTUAL_CITATION_NUMBER</ref> from the parsed PDF
+def addCitationNumber(citationNumbers, ref):
+    citationKey = (ref.text or '').replace(',', '').replace('[', '').replace(']', '').replace('(','').replace(')', '')
+    internalId = ref.attrib['target'].replace('#b', '')
     
-    citationDict = {}
-
-    refs = list(tree.findall(".//{http://www.tei-c.org/ns/1.0}ref[@type=\"bibr\"][@target]"))
-    for ref in refs:
-        citationKey = ref.text.replace(',', '').replace('[', '').replace(']', '').replace('(','').replace(')', '')
-        internalId = ref.attrib['target'].replace('#b', '')
-        
-        if citationKey.isnumeric() and internalId.isnumeric(): 
-            citationDict[int(internalId)] = int(citationKey)
-        elif internalId.isnumeric():
-            citationDict[int(internalId)] = cleanReferenceKey(citationKey)            
-
-    return citationDict
+    if citationKey.isnumeric() and internalId.isnumeric(): 
+        citationNumbers[int(internalId)] = int(citationKey)
+    elif internalId.isnumeric():
+        citationNumbers[int(internalId)] = cleanReferenceKey(citationKey)            
 
 # Key a key for improved matching (remove special characters, spaces etc.)
 def cleanReferenceKey(key):
@@ -280,33 +992,88 @@ def cleanReferenceKey(key):
     except TypeError:
         return key
 
-# Load the references from a parsed PDF 
-def loadReferences(tree):
+# Load the references of a paper from its reference index, which is stored next to the XML of the parsed PDF
+# The index is only built once per paper, and is rebuilt when the XML file or the index version has changed 
+def loadReferenceIndex(data_dir, paperId):
+    xmlPath = data_dir + 'parsedPaper-' + str(paperId) + '.xml'
+    indexPath = data_dir + 'parsedPaper-' + str(paperId) + '.index.pkl'
+
+    xmlHash = fileHash(xmlPath)
+
+    # Tables from the same paper share the index within a run
+    if xmlHash in referenceIndexes:
+        return referenceIndexes[xmlHash]
 
-    citationNumbers = internalIdToCitation(tree)
+    if os.path.exists(indexPath):
+        try:
+            with open(indexPath, 'rb') as indexFile:
+                index = pickle.load(indexFile)
 
-    # get the reference for a specific internal reference ID (in the form of bXXX)
+            if index['version'] == REFERENCE_INDEX_VERSION and index['xmlHash'] == xmlHash:
+                referenceIndexes[xmlHash] = index['references']
+                return index['references']
+        except (pickle.UnpicklingError, EOFError, KeyError, TypeError, AttributeError):
+            print(colored('Reference index ' + indexPath + ' is invalid, rebuilding it...', 'yellow'))
+
+    with instrumentation.timer('loadReferences'):
+        references = loadReferences(xmlPath)
+
+    index = {
+        'version': REFERENCE_INDEX_VERSION,
+        'xmlHash': xmlHash,
+        'references': references
+    }
+    writeFileAtomic(indexPath, pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+    referenceIndexes[xmlHash] = references
+
+    return references
+
+# Load the references from a parsed PDF 
+# The XML is streamed, only the references (<biblStruct> in <listBibl>) and citations (<ref type="bibr">) are processed,
+# all other elements are removed as soon as they are parsed so memory usage depends on the size of the bibliography
+def loadReferences(xmlPath):
+    citationNumbers = {}
+    parsedRefs = []
+    listBiblDepth = 0
+    biblStructDepth = 0
+
+    for event, element in etree.iterparse(xmlPath, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == TEI + 'listBibl':
+                listBiblDepth += 1
+            elif element.tag == TEI + 'biblStruct':
+                biblStructDepth += 1
+            continue
+
+        if element.tag == TEI + 'ref':
+            if element.get('type') == 'bibr' and element.get('target') is not None:
+                addCitationNumber(citationNumbers, element)
+        elif element.tag == TEI + 'biblStruct':
+            biblStructDepth -= 1
+
+            # get the reference for a specific internal reference ID (in the form of bXXX)
+            if listBiblDepth > 0 and element.get(XML_ID) is not None:
+                internalId = int(element.get(XML_ID).replace('b', ''))
+                parsedRefs.append((internalId, parseSingleRef(element)))
+        elif element.tag == TEI + 'listBibl':
+            listBiblDepth -= 1
+
+        # The children of a reference are needed until the reference itself is parsed, all other elements can be removed
+        if biblStructDepth == 0:
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    # Citations can appear anywhere in the paper, so the citation keys are only assigned once the whole paper is parsed
     references = {}
-    
-    tree = removeNameSpaceFromTree(tree)
-    
-    links = list(tree.findall(".//biblStruct[@{http://www.w3.org/XML/1998/namespace}id]"))
 
-    for i in links:
-        internalId = int(i.attrib['{http://www.w3.org/XML/1998/namespace}id'].replace('b', ''))
-        parsedRef = parseSingleRef(i)
+    for internalId, parsedRef in parsedRefs:
+        generatedKey = cleanReferenceKey(parsedRef['lastNameFirstAuthor'] + str(parsedRef['publicationYear']))
 
         if internalId in citationNumbers:
             citationKey = citationNumbers[internalId]
         else:
-            citationKey = cleanReferenceKey(parsedRef['lastNameFirstAuthor'] + str(parsedRef['publicationYear'])) # generate key manually 
-
-        title = ''
-        doi = ''
-        paperAuthors = []
-        publicationMonth = ''
-        publicationYear = ''
-        referenceRaw = ''
+            citationKey = generatedKey # generate key manually 
 
         references[citationKey] = {
             'title': parsedRef['title'],
@@ -315,28 +1082,39 @@ def loadReferences(tree):
             'publicationMonth': parsedRef['publicationMonth'], 
             'publicationYear': parsedRef['publicationYear'],
             'referenceRaw': parsedRef['referenceRaw'],
+            'generatedKey': generatedKey,
+            'authorCount': len(parsedRef['authors'])
         }
 
     return references
 
-# Remove namespaces from tree for easier matching 
-def removeNameSpaceFromTree(tree):
-
-    for elem in tree.getiterator():
-        elem.tag = etree.QName(elem).localname
-    # Remove unused namespace declarations
-    etree.cleanup_namespaces(tree)
+# Put elements without namespace in the TEI namespace (GROBID doesn't always add it to parsed raw references), 
+# so the same namespace aware parsing can be used for all references
+def addNameSpaceToTree(tree):
+    for elem in tree.iter(tag=etree.Element):
+        if etree.QName(elem).namespace is None:
+            elem.tag = TEI + elem.tag
 
     return tree
 
 def loadReferenceFromString(tree):
     tree = etree.fromstring(tree)
-    tree = removeNameSpaceFromTree(tree)
-    links = list(tree)
-    ref = parseSingleRef(links)
+    tree = addNameSpaceToTree(tree)
+    ref = parseSingleRef(tree)
 
     return ref
 
+# Split a list of references, as returned by GROBID when parsing multiple raw references at once, into separate reference strings
+def splitReferenceList(tree):
+    tree = etree.fromstring(tree)
+    tree = addNameSpaceToTree(tree)
+    refs = []
+
+    for biblStruct in tree.iter(TEI + 'biblStruct'):
+        refs.append(etree.tostring(biblStruct, encoding='unicode'))
+
+    return refs
+
 def parseSingleRef(i):
     title = ''
     doi = ''
@@ -347,7 +1125,7 @@ def parseSingleRef(i):
     lastNameFirstAuthor = ''
 
     for element in i:
-        if (element.tag == 'monogr'): 
+        if (element.tag == TEI + 'monogr'): 
 
             # In case there is no title found for the article, use the monogr title (sometimes it is parsed as monogr, but it should be analytic)
             if title == '':
@@ -363,7 +1141,7 @@ def parseSingleRef(i):
                 paperAuthors = parseAuthors(element)
 
             # Parse date
-            dateElement = element.find('imprint//date')
+            dateElement = element.find('tei:imprint//tei:date', NAMESPACES)
             if (dateElement is not None and 'when' in dateElement.attrib):
                 # Don't use dateutil since the year and month should be undefined when they are unknown
                 parsedDate = dateElement.attrib['when'].split('-')
@@ -372,13 +1150,13 @@ def parseSingleRef(i):
                 if len(parsedDate) > 1:
                     publicationMonth = int(parsedDate[1])
 
-        if (element.tag == 'analytic'): 
+        if (element.tag == TEI + 'analytic'): 
             title = parseTitle(element)
             doi = parseDoi(element)
             paperAuthors = parseAuthors(element)
             lastNameFirstAuthor = parseFirstAuthor(element)
         
-        if (element.tag) == 'note':
+        if (element.tag) == TEI + 'note':
             if 'type' in element.attrib and  element.attrib['type'] == 'raw_reference':
                 referenceRaw = element.text
             
@@ -395,28 +1173,28 @@ def parseSingleRef(i):
 def parseTitle(element):
     title = ''
 
-    if (element.find('title') is not None):
-        title = element.find('title').text
+    if (element.find('tei:title', NAMESPACES) is not None):
+        title = element.find('tei:title', NAMESPACES).text
 
     return title
 
 def parseRawReference(element):
     reference = ''
-    if (element.find('note') is not None):
-        reference = element.find('note').text
+    if (element.find('tei:note', NAMESPACES) is not None):
+        reference = element.find('tei:note', NAMESPACES).text
     return reference
 
 def parseDoi(element):
     doi = ''
 
-    if (element.find('idno[@type="DOI"]') is not None):
-        doi = element.find('idno[@type="DOI"]').text
+    if (element.find('tei:idno[@type="DOI"]', NAMESPACES) is not None):
+        doi = element.find('tei:idno[@type="DOI"]', NAMESPACES).text
 
     return doi
 
 # Generate a list of author names from the tree
 def parseAuthors(element):
-    authors = element.findall('author/persName')
+    authors = element.findall('tei:author/tei:persName', NAMESPACES)
     paperAuthors = []
 
     for author in authors:
@@ -424,17 +1202,17 @@ def parseAuthors(element):
         middleName = ''
         lastName = ''
 
-        findFirstName = author.find('forename[@type="first"]')
+        findFirstName = author.find('tei:forename[@type="first"]', NAMESPACES)
 
         if (findFirstName is not None): 
             firstName = findFirstName.text + ' '
 
-        findMiddleName = author.find('forename[@type="middle"]')
+        findMiddleName = author.find('tei:forename[@type="middle"]', NAMESPACES)
 
         if (findMiddleName is not None): 
             middleName = findMiddleName.text + ' '
 
-        findLastName = author.find('surname')
+        findLastName = author.find('tei:surname', NAMESPACES)
 
         if (findLastName is not None): 
             lastName = findLastName.text
@@ -446,17 +1224,17 @@ def parseAuthors(element):
 # For automatic key generation, get the last name of the first author and 
 # optionally add _et al._ in case there are multiple authors
 def parseFirstAuthor(element):
-    authors = element.findall('author/persName')
+    authors = element.findall('tei:author/tei:persName', NAMESPACES)
 
     firstName = ''
     if (len(authors) > 0):
-        findFirstName = authors[0].find('surname')
+        findFirstName = authors[0].find('tei:surname', NAMESPACES)
 
         if (findFirstName is not None): 
             firstName = findFirstName.text
 
     if (len(authors) == 2):
-        findFirstNameSecondAuthor = authors[1].find('surname')
+        findFirstNameSecondAuthor = authors[1].find('tei:surname', NAMESPACES)
 
         if (findFirstNameSecondAuthor is not None): 
             nameSecondAuthor = findFirstNameSecondAuthor.text
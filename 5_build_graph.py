@@ -17,264 +17,724 @@ import argparse
 from termcolor import colored
 import re
 import os
+from concurrent.futures import ThreadPoolExecutor
 import settings
-
-# Init ORKG with credentials from env file 
-orkg = settings.init_orkg() 
+from cache import LabelCache, PaperIndex
+from orkg_writer import OrkgWriter
+from journal import ImportJournal
+from files import writeFileAtomic
+from store import TableStore
+import instrumentation
+
+# ORKG client with credentials from env file, initialised in main so compiling a plan doesn't connect to the ORKG 
+orkg = None
 vocab = dict()
 cr = Crossref()
+labelCache = None # Persistent cache for the IDs of resources and predicates, disabled when None
+paperIndex = None # Persistent index of the papers in the ORKG by title, disabled when None
+paperIndexComplete = False # When all papers of the ORKG are fetched, titles that are not indexed don't have to be looked up
+writer = OrkgWriter() # Rate limits and retries the ORKG requests, replaced in main with the CLI options
 
-def main():
-    parser = argparse.ArgumentParser(description='Graph builder')
-    parser.add_argument("--dir", default=None)
-    parser.add_argument("--settings", default=None)
-    args = parser.parse_args()
+# Columns with the metadata of a paper, these are not inserted as statements of the contribution 
+METADATA_COLUMNS = ['title', 'authors', 'publicationMonth', 'publicationYear', 'doi', 'Reference', 'referenceRaw', 'ReferenceRaw']
+
+def main(argv=None):
+    args = parseArguments(argv)
+    instrumentation.printTableSummaries = args.metrics_summary
     data_dir = args.dir
     settingsFile = args.settings
     data_dir = './data/' if not data_dir else data_dir
     settingsFile = './tables.csv' if not settingsFile else settingsFile
-
-    settings_df = pd.read_csv(settingsFile, dtype=str)
+    journalDir = data_dir + 'journal/' if not args.journal_dir else args.journal_dir
+    planFile = data_dir + 'plan.jsonl' if not args.plan else args.plan
+
+    # Compile the tables into a write plan first, this doesn't need the ORKG
+    if args.apply_plan:
+        plan = readPlan(args.apply_plan)
+    else:
+        with instrumentation.timer('compilePlan'):
+            plan = compilePlan(data_dir, pd.read_csv(settingsFile, dtype=str), args.store)
+
+    if args.plan_only:
+        writePlan(planFile, plan)
+        print('Written plan with ' + str(len(plan)) + ' operations to ' + planFile)
+        instrumentation.report(args)
+        return
+
+    openOrkg(args, journalDir)
+    executePlan(plan, journalDir, args)
+    writer.shutdown()
+    instrumentation.report(args)
+
+# Parse the command line options, known is True to ignore options of other scripts (used by run_pipeline.py)
+def parseArguments(argv=None, known=False):
+    parser = argparse.ArgumentParser(description='Graph builder')
+    parser.add_argument("--dir", default=None)
+    parser.add_argument("--settings", default=None)
+    parser.add_argument("--label-cache", default='./cache/labels.sqlite', help='File of the cache for resource and predicate IDs')
+    parser.add_argument("--label-cache-ttl", type=float, default=30, help='Number of days a cached resource or predicate ID is used')
+    parser.add_argument("--no-label-cache", action='store_true', help='Always look up resources and predicates in the ORKG')
+    parser.add_argument("--clear-label-cache", action='store_true', help='Remove all cached resource and predicate IDs of the ORKG host before importing')
+    parser.add_argument("--lookup-workers", type=int, default=8, help='Number of resources and predicates that are looked up at the same time before importing')
+    parser.add_argument("--write-workers", type=int, default=4, help='Number of papers and requests that are sent to the ORKG at the same time')
+    parser.add_argument("--rate-limit", type=float, default=0, help='Maximum number of ORKG requests per second (0 for no limit)')
+    parser.add_argument("--max-retries", type=int, default=5, help='Number of retries of an ORKG request that is rate limited or failed with a server error')
+    parser.add_argument("--journal-dir", default=None, help='Directory of the import journals used to resume interrupted imports (default: journal in the data directory)')
+    parser.add_argument("--no-resume", action='store_true', help='Discard the import journals and import all tables again')
+    parser.add_argument("--paper-index", default='./cache/papers.sqlite', help='File of the index with the IDs and number of contributions of papers by title')
+    parser.add_argument("--no-paper-index", action='store_true', help='Always look up papers by title in the ORKG')
+    parser.add_argument("--fetch-paper-index", action='store_true', help='Fetch all papers of the ORKG into the paper index before importing')
+    parser.add_argument("--plan-only", action='store_true', help='Only compile the tables into a write plan, without importing anything')
+    parser.add_argument("--plan", default=None, help='File of the write plan that is written with --plan-only (default: plan.jsonl in the data directory)')
+    parser.add_argument("--apply-plan", default=None, help='Import a write plan that was compiled before, instead of the tables')
+    parser.add_argument("--store", default=None, help='Read the tables from this typed intermediate store (written by 4_reference_extraction.py --store) instead of the CSV files')
+    parser.add_argument("--metrics", default=None, help='Write the timings and call counts of the stages to this file')
+    parser.add_argument("--metrics-format", choices=['json', 'prometheus'], default=None, help='Format of the metrics file (default: prometheus for .prom files, otherwise json)')
+    parser.add_argument("--metrics-summary", action='store_true', help='Print the timings and call counts of each table and of the whole run')
+
+    if known:
+        return parser.parse_known_args(argv)
+
+    return parser.parse_args(argv)
+
+# Connect to the ORKG and open the label cache and paper index, before a plan is executed
+def openOrkg(args, journalDir):
+    global orkg, labelCache, paperIndex, writer
+    orkg = settings.init_orkg()
+    writer = OrkgWriter(args.write_workers, args.rate_limit, args.max_retries)
+
+    if not args.no_label_cache:
+        labelCache = LabelCache(args.label_cache, os.getenv('ORKG_API'), args.label_cache_ttl * 24 * 60 * 60)
+
+        if args.clear_label_cache:
+            labelCache.clear()
+
+    if not args.no_paper_index:
+        paperIndex = PaperIndex(args.paper_index, os.getenv('ORKG_API'))
+        indexJournals(journalDir)
+
+        if args.fetch_paper_index:
+            fetchPaperIndex()
+
+# Compile the tables listed in the settings CSV into a write plan, a list of operations that are applied by executePlan
+# Predicates and resources are referenced by symbolic IDs (e.g. '@predicate:Label'), they are looked up when the plan is applied
+def compilePlan(data_dir, settings_df, storeFile=None):
     tables = settings_df.iloc
+    plan = []
+    labels = set()
+
+    # With a store, the rows of all tables are read in one scan instead of reading a CSV file per table
+    storedTables = None
+    if storeFile is not None:
+        tableStore = TableStore(storeFile)
+        storedTables = tableStore.loadTables(set(str(table['tableID']) for table in tables))
+        tableStore.close()
 
     # For each table listed in the settings CSV
     for table in tables:
         table_id = table['tableID']
         table_file_name = str(table_id) + '.csv'
 
-        # If a corresponding table CSV file exists
-        if os.path.exists(data_dir + table_file_name):
+        # If a corresponding table CSV file exists (or the table is in the store)
+        if storedTables is not None and str(table_id) in storedTables or storedTables is None and os.path.exists(data_dir + table_file_name):
             #print('Loading CSV file...' + data_dir + table_file_name)
 
             research_field = 'R11'
             research_problem = table['problem']
             standard_statements = {}
-            contribution_ids = []
 
-            df = pd.read_csv(data_dir + table_file_name, dtype=str) 
-            papers = df.iloc
+            if storedTables is not None:
+                papers = storedTables[str(table_id)]
+            else:
+                df = pd.read_csv(data_dir + table_file_name, dtype=str) 
+                papers = df.iloc
+
+            plan.append({'op': 'table', 'table': table_id, 'title': table['title'], 'reference': table['reference']})
 
-            # For each paper in the table CSV
             for paper in papers:
-                insert_paper = {}
-
-                if paper['title'] and paper['title'] != '' and paper['title'] == paper['title']:
-                    insert_paper['paper'] = {}
-                    insert_paper['paper']['title'] = paper['title']
-                    insert_paper['paper']['authors'] = []
-                    insert_paper['paper']['publicationYear'] = ''
-                    insert_paper['paper']['publicationMonth'] = ''
-                    insert_paper['paper']['url'] = ''
-                    insert_paper['paper']['publishedIn'] = ''
-
-                    if paper['authors'] == paper['authors']: # Exclude NaN values 
-                        for author in paper['authors'].split(','):
-                            insert_paper['paper']['authors'].append({"label": author})
-
-                    if paper['publicationMonth'] == paper['publicationMonth']: # Exclude NaN values 
-                        insert_paper['paper']['publicationMonth'] = int(float(paper['publicationMonth']))
-                    
-                    if paper['publicationYear'] == paper['publicationYear']: # Exclude NaN values 
-                        insert_paper['paper']['publicationYear'] = int(float(paper['publicationYear']))
-
-                    if paper['doi'] == paper['doi']:  # Exclude NaN values 
-                        insert_paper['paper']['doi'] = paper['doi']
-                    
-                    # Delete the metadata from the triples that will be inserted (metadata is already added when adding a paper)
-                    # Required metadata
-                    del paper['title']
-                    del paper['authors']
-                    del paper['publicationMonth']
-                    del paper['publicationYear']
-                    del paper['doi']
-
-                    # Optional metadata
-                    if 'Reference' in paper:
-                        del paper['Reference']
-
-                    if 'referenceRaw' in paper:
-                        del paper['referenceRaw']
-
-                    if 'ReferenceRaw' in paper:
-                        del paper['ReferenceRaw']
-
-                    statements = {}
-
-                    for item in paper.iteritems(): 
-                        predicate = item[0].rstrip(string.digits) # Column, remove digits that are used to make columns unique by OpenRefine
-                        value = item[1] # Cell
-
-                        # If predicate starts with [R], insert it as resource instead of literal
-                        if predicate.startswith('[R]'):
-                            valueAsResource = True
-                            predicate = predicate.strip('[R]')
-                        else:
-                            valueAsResource = False
-
-                        if (value != value): # Don't insert NaN values
-                            continue
-
-                        predicateId = createOrFindPredicate(predicate)
-                        
-                        # Choose between adding a literal v.s. a resource
-                        if valueAsResource: 
-                            # Resource 
-                            resourceId = createOrFindResource(value)
-                            if predicateId in statements: 
-                                statements[predicateId].append({"@id": resourceId})
-                            else:
-                                statements[predicateId] = [
-                                    {"@id": resourceId}
-                                ]
-                        else:
-                            # Literal
-                            if predicateId in statements: 
-                                statements[predicateId].append({"text": value})
-                            else:
-                                statements[predicateId] = [
-                                    {"text": value}
-                                ]
-
-                    # Check if in the standard statements predicate IDs are used, or just strings
-                    # If there are only strings, it should be replace by the ID - and - insert the statements 
-                    statementsToInsert = standard_statements.copy()
-
-                    if len(statementsToInsert) > 0:
-                        for predicate in statementsToInsert:
-                            if isinstance(statementsToInsert[predicate], list): #if is array
-                                for i in range(len(statementsToInsert[predicate])):
-                                    if statementsToInsert[predicate][i]['values'] == 'CSV_PLACEHOLDER':
-                                        statementsToInsert[predicate][i]['values'] = statements
-
-                            if not re.search("^[P]+[a-zA-Z0-9]*$", predicate):                    
-                                predicateId = createOrFindPredicate(predicate)
-                                statementsToInsert[predicateId] = statementsToInsert[predicate]
-                                del statementsToInsert[predicate]
-                    else:
-                        statementsToInsert = statements
-                    
-                    # Add the table data to the default statements
-                
-                    # Create first contribution 
-                    insert_paper['paper']['researchField'] = research_field
-                    insert_paper['paper']['contributions'] = [
-                        {
-                            "name": "Contribution 1",
-                            "values": statementsToInsert
-                        }
-                    ]
-
-                    # Add research problem to the first contribution 
-                    if research_problem != '':
-                        research_problemId = createOrFindResource(research_problem) # Replace with something that assigns a class to the problem
-                        
-                        insert_paper['paper']['contributions'][0]['values']['P32'] = [
-                            {"@id": research_problemId}
-                        ]
-                    
-                    existingPaper = orkg.resources.get(q=insert_paper['paper']['title'], exact=True).content
-                    
-                    # If a paper already exists, add a contribution 
-                    if (len(existingPaper) > 0): 
-                        paperId = existingPaper[0]['id']
-                        paperStatements = orkg.statements.get_by_subject(subject_id=paperId).content
-                        contributionAmount = 0
-
-                        for paperStatement in paperStatements:
-                            if paperStatement['predicate']['id'] == 'P31':
-                                contributionAmount += 1
-
-                        contributionId = orkg.resources.add(label="Contribution " + str(contributionAmount + 1), classes=['Contribution']).content['id']
-
-                        orkg.statements.add(subject_id=paperId, predicate_id="P31", object_id=contributionId)
-                        
-                        for predicateId in insert_paper['paper']['contributions'][0]['values']:
-                            values = insert_paper['paper']['contributions'][0]['values'][predicateId]
-                            
-                            for value in values:
-                                if 'text' in value:
-                                    literalId = orkg.literals.add(label=value['text']).content['id']
-                                    orkg.statements.add(subject_id=contributionId, predicate_id=predicateId, object_id=literalId)
-                                elif '@id' in value:
-                                    orkg.statements.add(subject_id=contributionId, predicate_id=predicateId, object_id=value['@id'])
-                        
-                        contribution_ids.append(contributionId)
-                    # Paper doesn't exist yet, add a new paper 
-                    else:
-                        response1 = orkg.papers.add(insert_paper)
-
-                        try: 
-                            if ('id' in response1.content):
-                                paper_id = response1.content['id']
-                                paper_statements = orkg.statements.get_by_subject(subject_id=paper_id).content
-                                for statement in paper_statements:
-                                    if statement['predicate']['id'] == 'P31':
-                                        contribution_ids.append(statement['object']['id'])
-                            else:
-                                print(json.dumps(insert_paper))
-                                print(colored('Error, paper has not been added to ORKG', 'red'))
-                        except TypeError:
-                            print(json.dumps(insert_paper))
-                            print(colored('Error, paper has not been added to ORKG', 'red'))
-
-            createComparison(table['title'], table['reference'], contribution_ids, table_id)
+                if hasTitle(paper):
+                    insert_paper = buildPaper(paper, research_field, research_problem, standard_statements)
+                    mapSymbols(insert_paper, lambda symbol: labels.add(symbol) or symbol)
+                    plan.append({'op': 'paper', 'table': table_id, 'paper': insert_paper})
+
+            plan.append({'op': 'comparison', 'table': table_id})
+
+    # The labels are listed first, so they can all be looked up before importing
+    labelOperations = []
+
+    for symbol in sorted(labels):
+        entityType, label = parseSymbol(symbol)
+        labelOperations.append({'op': 'label', 'type': entityType, 'label': label})
+
+    return labelOperations + plan
+
+# Apply a write plan to the ORKG
+def executePlan(plan, journalDir, args):
+    # Look up (or create) all predicates and resources of all tables first, so importing the papers doesn't have to wait for lookups 
+    predicateLabels = set(operation['label'] for operation in plan if operation['op'] == 'label' and operation['type'] == 'predicate')
+    resourceLabels = set(operation['label'] for operation in plan if operation['op'] == 'label' and operation['type'] == 'resource')
+    with instrumentation.timer('warmUpLabels'):
+        warmUpLabels(predicateLabels, resourceLabels, args.lookup_workers)
+
+    tables = {}
+
+    for operation in plan:
+        if operation['op'] == 'table':
+            tables[operation['table']] = (operation, [])
+        elif operation['op'] == 'paper':
+            tables[operation['table']][1].append(mapSymbols(operation['paper'], resolveSymbol))
+        elif operation['op'] == 'comparison':
+            table, insertPapers = tables.pop(operation['table'])
+            table_id = table['table']
+
+            with instrumentation.table(table_id):
+                importTable(table, insertPapers, journalDir, args)
+
+# Import the papers of a table and create its comparison, unless the journal shows the table is already imported
+def importTable(table, insertPapers, journalDir, args):
+    table_id = table['table']
+    journal = ImportJournal(os.path.join(journalDir, str(table_id) + '.jsonl'), resume=not args.no_resume)
+
+    # The table is already completely imported by an earlier run
+    if journal.comparisonId is not None:
+        print(table_id + ' ', '/comparison/' + journal.comparisonId, '(already imported)')
+        journal.close()
+        return
+
+    # The predicates and resources are already looked up, so the papers can be imported at the same time
+    with instrumentation.timer('importPapers'):
+        contribution_ids = importPapers(insertPapers, journal)
+
+    with instrumentation.timer('createComparison'):
+        comparisonId = createComparison(table['title'], table['reference'], contribution_ids, table_id)
+
+    journal.record({'type': 'comparison', 'comparisonId': comparisonId})
+    journal.close()
+
+# Symbolic ID of a predicate or resource in the write plan
+def symbol(entityType, label):
+    return '@' + entityType + ':' + label.strip()
+
+def parseSymbol(value):
+    entityType, label = value[1:].split(':', 1)
+
+    return entityType, label
+
+def isSymbol(value):
+    return isinstance(value, str) and (value.startswith('@predicate:') or value.startswith('@resource:'))
+
+# Replace the symbolic IDs in a paper, these are the predicates of the contribution values and the '@id' of resources
+def mapSymbols(value, function):
+    if isinstance(value, list):
+        return [mapSymbols(item, function) for item in value]
+
+    if isinstance(value, dict):
+        mapped = {}
+
+        for key, item in value.items():
+            if isSymbol(key):
+                key = function(key)
+
+            if key == '@id' and isSymbol(item):
+                mapped[key] = function(item)
+            else:
+                mapped[key] = mapSymbols(item, function)
+
+        return mapped
+
+    return value
+
+# Get the ORKG ID of a symbolic ID, creates the predicate or resource if it doesn't exist
+def resolveSymbol(value):
+    entityType, label = parseSymbol(value)
+
+    if entityType == 'predicate':
+        return createOrFindPredicate(label)
+
+    return createOrFindResource(label)
+
+def writePlan(planFile, plan):
+    writeFileAtomic(planFile, ''.join(json.dumps(operation) + '\n' for operation in plan))
+
+def readPlan(planFile):
+    with open(planFile, encoding='utf-8') as lines:
+        return [json.loads(line) for line in lines if line.strip() != '']
+
+# Build the paper object that is inserted in the ORKG from a row of the table CSV
+def buildPaper(paper, research_field, research_problem, standard_statements):
+    insert_paper = {}
+    insert_paper['paper'] = {}
+    insert_paper['paper']['title'] = paper['title']
+    insert_paper['paper']['authors'] = []
+    insert_paper['paper']['publicationYear'] = ''
+    insert_paper['paper']['publicationMonth'] = ''
+    insert_paper['paper']['url'] = ''
+    insert_paper['paper']['publishedIn'] = ''
+
+    if hasValue(paper['authors']):
+        # The CSV files have the authors joined with commas, the store has a list of authors
+        authors = paper['authors'].split(',') if isinstance(paper['authors'], str) else paper['authors']
+
+        for author in authors:
+            insert_paper['paper']['authors'].append({"label": author})
+
+    if hasValue(paper['publicationMonth']):
+        insert_paper['paper']['publicationMonth'] = int(float(paper['publicationMonth']))
+    
+    if hasValue(paper['publicationYear']):
+        insert_paper['paper']['publicationYear'] = int(float(paper['publicationYear']))
+
+    if hasValue(paper['doi']):
+        insert_paper['paper']['doi'] = paper['doi']
+    
+    statements = {}
+
+    for predicate, value, valueAsResource in paperCells(paper):
+        predicateId = symbol('predicate', predicate)
+        
+        # Choose between adding a literal v.s. a resource
+        if valueAsResource: 
+            # Resource 
+            resourceId = symbol('resource', value)
+            if predicateId in statements: 
+                statements[predicateId].append({"@id": resourceId})
+            else:
+                statements[predicateId] = [
+                    {"@id": resourceId}
+                ]
+        else:
+            # Literal
+            if predicateId in statements: 
+                statements[predicateId].append({"text": value})
+            else:
+                statements[predicateId] = [
+                    {"text": value}
+                ]
+
+    # Check if in the standard statements predicate IDs are used, or just strings
+    # If there are only strings, it should be replace by the ID - and - insert the statements 
+    statementsToInsert = standard_statements.copy()
+
+    if len(statementsToInsert) > 0:
+        for predicate in statementsToInsert:
+            if isinstance(statementsToInsert[predicate], list): #if is array
+                for i in range(len(statementsToInsert[predicate])):
+                    if statementsToInsert[predicate][i]['values'] == 'CSV_PLACEHOLDER':
+                        statementsToInsert[predicate][i]['values'] = statements
+
+            if not re.search("^[P]+[a-zA-Z0-9]*$", predicate):                    
+                predicateId = symbol('predicate', predicate)
+                statementsToInsert[predicateId] = statementsToInsert[predicate]
+                del statementsToInsert[predicate]
+    else:
+        statementsToInsert = statements
+    
+    # Add the table data to the default statements
+
+    # Create first contribution 
+    insert_paper['paper']['researchField'] = research_field
+    insert_paper['paper']['contributions'] = [
+        {
+            "name": "Contribution 1",
+            "values": statementsToInsert
+        }
+    ]
+
+    # Add research problem to the first contribution 
+    if isinstance(research_problem, str) and research_problem != '':
+        research_problemId = symbol('resource', research_problem) # Replace with something that assigns a class to the problem
+        
+        insert_paper['paper']['contributions'][0]['values']['P32'] = [
+            {"@id": research_problemId}
+        ]
+
+    return insert_paper
+
+# Import the papers at the same time, returns the contribution IDs in the same order as the papers
+# Papers with the same title are imported one after another, since the later ones are added as a contribution to the first one
+def importPapers(insertPapers, journal):
+    titleGroups = {}
+
+    for index, insert_paper in enumerate(insertPapers):
+        titleGroups.setdefault(PaperIndex.normalise(insert_paper['paper']['title']), []).append(index)
+
+    def importGroup(indexes):
+        return [(index, importPaper(insertPapers[index], journal, journal.rowKey(index, insertPapers[index]))) for index in indexes]
+
+    contributionsPerPaper = {}
+
+    for results in writer.runTasks(importGroup, list(titleGroups.values())):
+        contributionsPerPaper.update(results)
+
+    return [contributionId for index in range(len(insertPapers)) for contributionId in contributionsPerPaper[index]]
+
+# Import a single paper, or add it as a contribution if a paper with the same title exists. Returns the IDs of the added contributions
+# Writes are recorded in the journal, so a paper or contribution that was added by an interrupted run is not added again 
+def importPaper(insert_paper, journal, rowKey):
+    done = journal.row(rowKey)
+    resumed = len(done) > 0
+
+    # The paper was completely imported by an earlier run
+    if 'contributionIds' in done:
+        return done['contributionIds']
+
+    title = insert_paper['paper']['title']
+    contribution_ids = []
+    contributionAmount = None
+
+    if not resumed:
+        existingPaper = findPaper(title)
+        
+        # If a paper already exists, add a contribution 
+        if existingPaper is not None: 
+            paperId, contributionAmount = existingPaper
+            contributionName = "Contribution " + str(contributionAmount + 1)
+            values = insert_paper['paper']['contributions'][0]['values']
+            contributionId = addContributionObject(contributionName, values)
+
+            if contributionId is None:
+                contributionId = addContributionStatements(contributionName, values)
+
+            done = {'paperId': paperId, 'contributionId': contributionId}
+            journal.record({'type': 'contribution', 'row': rowKey, 'title': title, 'paperId': paperId, 'contributionId': contributionId})
+        # Paper doesn't exist yet, add a new paper 
+        else:
+            response1 = writer.call(orkg.papers.add, insert_paper)
+
+            try: 
+                if ('id' in response1.content):
+                    done = {'paperId': response1.content['id']}
+                    journal.record({'type': 'paper', 'row': rowKey, 'title': title, 'paperId': response1.content['id']})
+                else:
+                    print(json.dumps(insert_paper))
+                    print(colored('Error, paper has not been added to ORKG', 'red'))
+            except TypeError:
+                print(json.dumps(insert_paper))
+                print(colored('Error, paper has not been added to ORKG', 'red'))
+
+    # Link the added contribution to the existing paper, unless an interrupted run already did
+    if 'contributionId' in done:
+        linked = False
+
+        if resumed:
+            paperStatements = writer.call(orkg.statements.get_by_subject, subject_id=done['paperId']).content
+            linked = any(statement['predicate']['id'] == 'P31' and statement['object']['id'] == done['contributionId'] for statement in paperStatements)
+
+        if not linked:
+            writer.call(orkg.statements.add, subject_id=done['paperId'], predicate_id="P31", object_id=done['contributionId'])
+        
+        contribution_ids.append(done['contributionId'])
+
+        # The number of contributions is unknown when resuming, since other contributions could have been added in the meantime
+        rememberPaper(title, done['paperId'], contributionAmount + 1 if contributionAmount is not None else None)
+    # Collect the contributions of the added paper
+    elif 'paperId' in done:
+        paper_statements = writer.call(orkg.statements.get_by_subject, subject_id=done['paperId']).content
+        for statement in paper_statements:
+            if statement['predicate']['id'] == 'P31':
+                contribution_ids.append(statement['object']['id'])
+
+        rememberPaper(title, done['paperId'], len(contribution_ids))
+
+    if len(contribution_ids) > 0:
+        journal.record({'type': 'row', 'row': rowKey, 'contributionIds': contribution_ids})
+
+    return contribution_ids
+
+# Find a paper by title, in the paper index or otherwise in the ORKG. Returns the paper ID and number of contributions, or None when it doesn't exist
+def findPaper(title):
+    if paperIndex is not None:
+        indexed = paperIndex.get(title)
+
+        if indexed is not None:
+            paperId, contributionAmount = indexed
+
+            if contributionAmount is None:
+                contributionAmount = countContributions(paperId)
+                rememberPaper(title, paperId, contributionAmount)
+
+            return paperId, contributionAmount
+
+        if paperIndexComplete:
+            return None
+
+    existingPaper = writer.call(orkg.resources.get, q=title, exact=True).content
+
+    if len(existingPaper) == 0:
+        return None
+
+    paperId = existingPaper[0]['id']
+    contributionAmount = countContributions(paperId)
+    rememberPaper(title, paperId, contributionAmount)
+
+    return paperId, contributionAmount
+
+# Count the contributions (P31 statements) of a paper in the ORKG
+def countContributions(paperId):
+    paperStatements = writer.call(orkg.statements.get_by_subject, subject_id=paperId).content
+    contributionAmount = 0
+
+    for paperStatement in paperStatements:
+        if paperStatement['predicate']['id'] == 'P31':
+            contributionAmount += 1
+
+    return contributionAmount
+
+def rememberPaper(title, paperId, contributionAmount):
+    if paperIndex is not None:
+        paperIndex.set(title, paperId, contributionAmount)
+
+# Add the papers from the import journals to the paper index, so papers imported by earlier runs are not looked up again
+def indexJournals(journalDir):
+    if not os.path.isdir(journalDir):
+        return
+
+    papers = []
+
+    for journalFile in sorted(os.listdir(journalDir)):
+        if not journalFile.endswith('.jsonl'):
+            continue
+
+        with open(os.path.join(journalDir, journalFile), encoding='utf-8') as lines:
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+
+                if 'title' in record and 'paperId' in record:
+                    papers.append((record['title'], record['paperId']))
+
+    paperIndex.add(papers)
+
+# Fetch all papers of the ORKG page by page and add them to the paper index
+def fetchPaperIndex(pageSize=500):
+    global paperIndexComplete
+
+    if not hasattr(orkg.classes, 'get_resource_by_class'):
+        print(colored('The ORKG client does not support listing all papers, papers are looked up by title instead', 'yellow'))
+        return
+
+    # The pages of the ORKG API are numbered from 0
+    page = 0
+    amount = 0
+
+    while True:
+        response = writer.call(orkg.classes.get_resource_by_class, class_id='Paper', page=page, items=pageSize)
+
+        # Paged responses have the papers in 'content', error responses are objects without it
+        resources = response.content.get('content') if isinstance(response.content, dict) else response.content
+
+        if not response.succeeded or not isinstance(resources, list):
+            print(colored('Error, papers could not be fetched from ORKG, papers that are not indexed are looked up by title', 'red'))
+            return
+
+        paperIndex.add([(resource['label'], resource['id']) for resource in resources])
+        amount += len(resources)
+
+        # Paged responses also mark the last page
+        if len(resources) < pageSize or isinstance(response.content, dict) and response.content.get('last'):
+            break
+
+        page += 1
+
+    paperIndexComplete = True
+    print('Fetched ' + str(amount) + ' papers for the paper index')
+
+# Add a contribution with all its literals and resources in a single request, using the objects endpoint of the ORKG
+# Returns None when the ORKG didn't accept it
+def addContributionObject(name, values):
+    contribution = {
+        "predicates": [],
+        "resource": {
+            "name": name,
+            "classes": ["Contribution"],
+            "values": values
+        }
+    }
+
+    try:
+        # The pinned client (orkg 0.4.2) has no objects client, then the object is posted to the endpoint directly
+        if hasattr(orkg, 'objects'):
+            content = writer.call(orkg.objects.add, params=contribution).content
+        else:
+            content = writer.call(postObject, contribution).json()
+
+        if isinstance(content, dict) and 'id' in content:
+            return content['id']
+    except (TypeError, ValueError):
+        pass
+
+    print(colored('Contribution could not be added as a single object, adding its statements one by one', 'yellow'))
+
+    return None
+
+# Post an object to the objects endpoint through the backend of the ORKG client, returns the HTTP response
+def postObject(contribution):
+    with instrumentation.timer('orkg.objects.add'):
+        orkg.backend._append_slash = True
+        return orkg.backend.objects.POST(json=contribution, headers=orkg.resources.auth)
+
+# Add a contribution by creating the resource and adding a literal and statement for each value
+def addContributionStatements(name, values):
+    contributionId = writer.call(orkg.resources.add, label=name, classes=['Contribution']).content['id']
+
+    # The statements of the contribution don't depend on each other, so they are added at the same time
+    literals = []
+    statements = []
+    
+    for predicateId in values:
+        for value in values[predicateId]:
+            if 'text' in value:
+                literals.append((predicateId, writer.submit(orkg.literals.add, label=value['text'])))
+            elif '@id' in value:
+                statements.append(writer.submit(orkg.statements.add, subject_id=contributionId, predicate_id=predicateId, object_id=value['@id']))
+
+    for predicateId, literal in literals:
+        statements.append(writer.submit(orkg.statements.add, subject_id=contributionId, predicate_id=predicateId, object_id=literal.result().content['id']))
+
+    for statement in statements:
+        statement.result()
+
+    return contributionId
 
 # Create a comparison resource in ORKG, add the title, reference and the URL 
 def createComparison(title, reference, contribution_ids, table_id):
-    comparisonId = orkg.resources.add(label=title, classes=['Comparison']).content['id']
-    descriptionId = orkg.literals.add(label="").content['id']
-    referenceId = orkg.literals.add(label=reference).content['id']
+    comparison = writer.submit(orkg.resources.add, label=title, classes=['Comparison'])
+    description = writer.submit(orkg.literals.add, label="")
+    referenceLiteral = writer.submit(orkg.literals.add, label=reference)
     contribution_ids = ",".join(contribution_ids)
-    urlId = orkg.literals.add(label="?contributions=" + contribution_ids).content['id']
+    url = writer.submit(orkg.literals.add, label="?contributions=" + contribution_ids)
+    comparisonId = comparison.result().content['id']
     
-    orkg.statements.add(subject_id=comparisonId, predicate_id="description", object_id=descriptionId).content['id']
-    orkg.statements.add(subject_id=comparisonId, predicate_id="url", object_id=urlId).content['id']
-    orkg.statements.add(subject_id=comparisonId, predicate_id="reference", object_id=referenceId).content['id']
+    statements = [
+        writer.submit(orkg.statements.add, subject_id=comparisonId, predicate_id="description", object_id=description.result().content['id']),
+        writer.submit(orkg.statements.add, subject_id=comparisonId, predicate_id="url", object_id=url.result().content['id']),
+        writer.submit(orkg.statements.add, subject_id=comparisonId, predicate_id="reference", object_id=referenceLiteral.result().content['id'])
+    ]
+
+    for statement in statements:
+        statement.result()
 
     print(table_id + ' ', '/comparison/' + comparisonId)
 
+    return comparisonId
+
+# Check if the paper has a title, papers without title are not imported
+def hasTitle(paper):
+    return paper['title'] and paper['title'] != '' and paper['title'] == paper['title']
+
+# Exclude NaN values (from the CSV files) and None values (from the store)
+def hasValue(value):
+    return value is not None and value == value
+
+# Get the cells of a paper that are inserted as statements, together with the predicate label and whether the value should be a resource
+def paperCells(paper):
+    cells = []
+
+    for column, value in paper.items(): 
+        # The metadata is already added when adding a paper
+        if column in METADATA_COLUMNS:
+            continue
+
+        predicate = column.rstrip(string.digits) # Column, remove digits that are used to make columns unique by OpenRefine
+
+        # If predicate starts with [R], insert it as resource instead of literal
+        if predicate.startswith('[R]'):
+            valueAsResource = True
+            predicate = predicate.strip('[R]')
+        else:
+            valueAsResource = False
+
+        if not hasValue(value): # Don't insert NaN values
+            continue
+
+        cells.append((predicate, value, valueAsResource))
+
+    return cells
+
+# Look up all labels at the same time with a limited number of workers, afterwards create the ones that don't exist yet
+def warmUpLabels(predicateLabels, resourceLabels, workers):
+    labels = [('predicate', label) for label in sorted(predicateLabels)] + [('resource', label) for label in sorted(resourceLabels)]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        foundIds = list(executor.map(lambda item: findLabel(item[0], item[1]), labels))
+        missingLabels = [item for item, foundId in zip(labels, foundIds) if foundId is None]
+        list(executor.map(lambda item: createLabel(item[0], item[1]), missingLabels))
+
+    print('Looked up ' + str(len(predicateLabels)) + ' predicates and ' + str(len(resourceLabels)) + ' resources, created ' + str(len(missingLabels)))
+
 lookedUpResources = {}
+lookedUpPredicates = {}
 
-# Loopup resource by label, create if it doesn't exist
-def createOrFindResource(label):
+# Find the ID of a resource or predicate by label, in the cache or otherwise in the ORKG. Returns None when it doesn't exist
+def findLabel(entityType, label):
     label = label.strip()
+    lookedUp = lookedUpResources if entityType == 'resource' else lookedUpPredicates
+
+    # Counted as e.g. 'lookedUpResources.hit'
+    cacheName = 'lookedUpResources' if entityType == 'resource' else 'lookedUpPredicates'
+
+    if label in lookedUp:
+        instrumentation.count(cacheName + '.hit')
+        return lookedUp[label]
+
+    instrumentation.count(cacheName + '.miss')
+
+    if labelCache is not None:
+        entityId = labelCache.get(entityType, label)
 
-    if label in lookedUpResources:
-        return lookedUpResources[label]
+        if entityId is not None:
+            instrumentation.count('labelCache.hit')
+            lookedUp[label] = entityId
+            return entityId
+
+        instrumentation.count('labelCache.miss')
+
+    client = orkg.resources if entityType == 'resource' else orkg.predicates
 
-    findResource = orkg.resources.get(q=label, exact=True).content
     try:
-        if (len(findResource) > 0):
-            resource = findResource[0]['id']
-        else:
-            resource = orkg.resources.add(label=label).content['id']
+        found = writer.call(client.get, q=label, exact=True).content
+
+        if (len(found) > 0):
+            rememberLabel(entityType, label, found[0]['id'])
+            return found[0]['id']
     except:
         print(label)
-        resource = orkg.resources.add(label=label).content['id']
 
-    lookedUpResources[label] = resource
+    return None
 
-    return resource
+# Create a resource or predicate in the ORKG
+def createLabel(entityType, label):
+    label = label.strip()
+    client = orkg.resources if entityType == 'resource' else orkg.predicates
+    entityId = writer.call(client.add, label=label).content['id']
+    rememberLabel(entityType, label, entityId)
 
-lookedUpPredicates = {}
+    return entityId
+
+def rememberLabel(entityType, label, entityId):
+    lookedUp = lookedUpResources if entityType == 'resource' else lookedUpPredicates
+    lookedUp[label] = entityId
+
+    if labelCache is not None:
+        labelCache.set(entityType, label, entityId)
+
+# Loopup resource by label, create if it doesn't exist
+def createOrFindResource(label):
+    resource = findLabel('resource', label)
+
+    if resource is None:
+        resource = createLabel('resource', label)
+
+    return resource
 
 # Loopup predicate by label, create if it doesn't exist
 def createOrFindPredicate(label):
-    label = label.strip()
-    
-    if label in lookedUpPredicates:
-        return lookedUpPredicates[label]
-
-    findPredicate = orkg.predicates.get(q=label, exact=True).content
-    try:
-        if (len(findPredicate) > 0):
-            predicate = findPredicate[0]['id']
-        else:
-            predicate = orkg.predicates.add(label=label).content['id']
-    except:
-        predicate = orkg.predicates.add(label=label).content['id']
+    predicate = findLabel('predicate', label)
 
-    lookedUpPredicates[label] = predicate
+    if predicate is None:
+        predicate = createLabel('predicate', label)
 
     return predicate
 
@@ -0,0 +1,158 @@
+'''
+Persistent cache for API responses, stored in a single SQLite file. Entries are looked up by a
+hash of the request content and options, so identical requests are only sent once, even across runs.
+When the cache grows beyond its maximum size, the least recently used entries are removed.
+'''
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class ResponseCache:
+    def __init__(self, path, maxSize):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.maxSize = maxSize
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, size INTEGER, accessed REAL)')
+        self.connection.commit()
+
+    # Build the key of a request, content can be a string or bytes (e.g. the contents of a PDF file)
+    @staticmethod
+    def key(endpoint, options, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+
+        digest = hashlib.sha256()
+        digest.update(endpoint.encode('utf-8') + b'\0')
+        digest.update(json.dumps(options, sort_keys=True).encode('utf-8') + b'\0')
+        digest.update(content)
+
+        return digest.hexdigest()
+
+    # Get a cached response, returns None in case the response is not cached
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute('SELECT value FROM responses WHERE key = ?', (key,)).fetchone()
+
+            if row is None:
+                return None
+
+            self.connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (time.time(), key))
+            self.connection.commit()
+
+            return row[0]
+
+    def set(self, key, value):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO responses (key, value, size, accessed) VALUES (?, ?, ?, ?)', (key, value, len(value.encode('utf-8')), time.time()))
+            self.evict()
+            self.connection.commit()
+
+    # Remove the least recently used entries until the cache fits within its maximum size again
+    def evict(self):
+        totalSize = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+        if totalSize <= self.maxSize:
+            return
+
+        for key, size in self.connection.execute('SELECT key, size FROM responses ORDER BY accessed ASC').fetchall():
+            if totalSize <= self.maxSize:
+                break
+
+            self.connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+            totalSize -= size
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+# Cache for the IDs of ORKG resources and predicates, looked up by host, type and label
+# Entries expire after the TTL, since resources can be removed or merged in the ORKG
+class LabelCache:
+    def __init__(self, path, host, ttl):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.host = host
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS labels (host TEXT, type TEXT, label TEXT, id TEXT, created REAL, PRIMARY KEY (host, type, label))')
+        self.connection.execute('DELETE FROM labels WHERE created < ?', (time.time() - self.ttl,))
+        self.connection.commit()
+
+    # Labels are normalised the same way as for the lookups in the ORKG
+    @staticmethod
+    def normalise(label):
+        return label.strip()
+
+    # Get the ID for a label of a type ('resource' or 'predicate'), returns None in case the label is not cached
+    def get(self, entityType, label):
+        with self.lock:
+            row = self.connection.execute('SELECT id FROM labels WHERE host = ? AND type = ? AND label = ? AND created >= ?', (self.host, entityType, self.normalise(label), time.time() - self.ttl)).fetchone()
+
+            return row[0] if row is not None else None
+
+    def set(self, entityType, label, entityId):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO labels (host, type, label, id, created) VALUES (?, ?, ?, ?, ?)', (self.host, entityType, self.normalise(label), entityId, time.time()))
+            self.connection.commit()
+
+    # Remove all cached labels of the host
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM labels WHERE host = ?', (self.host,))
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+# Index of the papers in the ORKG, looked up by host and normalised title
+# Stores the paper ID and the number of contributions, a count of None means it is unknown and has to be looked up
+class PaperIndex:
+    def __init__(self, path, host):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.host = host
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS papers (host TEXT, title TEXT, id TEXT, contributions INTEGER, PRIMARY KEY (host, title))')
+        self.connection.commit()
+
+    # Titles are compared without case and surrounding or repeated whitespace
+    @staticmethod
+    def normalise(title):
+        return ' '.join(title.split()).lower()
+
+    # Get the paper ID and number of contributions of a title, returns None in case the paper is not indexed
+    def get(self, title):
+        with self.lock:
+            row = self.connection.execute('SELECT id, contributions FROM papers WHERE host = ? AND title = ?', (self.host, self.normalise(title))).fetchone()
+
+            return (row[0], row[1]) if row is not None else None
+
+    def set(self, title, paperId, contributions):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO papers (host, title, id, contributions) VALUES (?, ?, ?, ?)', (self.host, self.normalise(title), paperId, contributions))
+            self.connection.commit()
+
+    # Add papers without replacing the ones that are already indexed, since those can have a known number of contributions
+    def add(self, papers):
+        with self.lock:
+            self.connection.executemany('INSERT OR IGNORE INTO papers (host, title, id, contributions) VALUES (?, ?, ?, ?)', [(self.host, self.normalise(title), paperId, None) for title, paperId in papers])
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,222 @@
+'''
+In-memory stand-in for the ORKG client, used to run and benchmark the graph builder without an ORKG instance.
+It implements the part of the client that is used by the scripts (resources, predicates, literals, statements,
+papers, listing resources by class and the objects endpoint of the backend) and counts the requests per endpoint.
+Optionally, a latency is added to every request and a fraction of the requests fails with HTTP 503, before anything
+is written.
+
+Enable it by setting the ORKG API in the env file to e.g. `ORKG_API=fake://?latency=0.01&errors=0.05`
+'''
+
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+    @property
+    def succeeded(self):
+        return self.status_code < 400
+
+    @property
+    def ok(self):
+        return self.succeeded
+
+    def json(self):
+        return self.content
+
+class FakeOrkg:
+    # latency is the number of seconds every request takes, errorRate the fraction of requests that fail
+    def __init__(self, latency=0, errorRate=0, seed=None):
+        self.latency = latency
+        self.errorRate = errorRate
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.counters = Counter()
+        self.errors = Counter()
+
+        self.nextId = 1
+        self.entities = {} # ID -> {'id', 'label', 'classes', '_class'}
+        self.labels = {} # (type, label) -> [IDs], for the exact lookups
+        self.statementsById = {}
+        self.bySubject = {}
+        self.byObject = {}
+
+        self.resources = FakeResources(self)
+        self.predicates = FakePredicates(self)
+        self.literals = FakeLiterals(self)
+        self.statements = FakeStatements(self)
+        self.papers = FakePapers(self)
+        self.backend = FakeBackend(self)
+        self.resources.auth = None
+        self.classes = FakeClasses(self)
+
+    # Create a fake ORKG from a URL like fake://?latency=0.01&errors=0.05&seed=1
+    @classmethod
+    def fromUrl(cls, url):
+        options = parse_qs(urlparse(url).query)
+
+        return cls(
+            latency=float(options.get('latency', [0])[0]),
+            errorRate=float(options.get('errors', [0])[0]),
+            seed=int(options['seed'][0]) if 'seed' in options else None
+        )
+
+    # Handle a request of an endpoint, returns an error response instead of calling the function when an error is injected
+    def request(self, endpoint, function):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.counters[endpoint] += 1
+
+            if self.errorRate > 0 and self.random.random() < self.errorRate:
+                self.errors[endpoint] += 1
+                return FakeResponse({'status': 503, 'error': 'Service Unavailable'}, 503)
+
+            return FakeResponse(function())
+
+    def totalRequests(self):
+        with self.lock:
+            return sum(self.counters.values())
+
+    def createEntity(self, entityType, label, classes=None):
+        prefix = {'resource': 'R', 'predicate': 'P', 'literal': 'L'}[entityType]
+        entityId = prefix + str(self.nextId)
+        self.nextId += 1
+
+        entity = {'id': entityId, 'label': label, '_class': entityType}
+        if entityType == 'resource':
+            entity['classes'] = list(classes or [])
+
+        self.entities[entityId] = entity
+        self.labels.setdefault((entityType, label), []).append(entityId)
+
+        return entity
+
+    def findEntities(self, entityType, q, exact):
+        if exact:
+            return [self.entities[entityId] for entityId in self.labels.get((entityType, q), [])]
+
+        return [entity for entity in self.entities.values() if entity['_class'] == entityType and q.lower() in entity['label'].lower()]
+
+    def createStatement(self, subjectId, predicateId, objectId):
+        statementId = 'S' + str(self.nextId)
+        self.nextId += 1
+
+        statement = {
+            'id': statementId,
+            'subject': self.entityOrPlaceholder(subjectId),
+            'predicate': self.entityOrPlaceholder(predicateId),
+            'object': self.entityOrPlaceholder(objectId)
+        }
+
+        self.statementsById[statementId] = statement
+        self.bySubject.setdefault(subjectId, []).append(statement)
+        self.byObject.setdefault(objectId, []).append(statement)
+
+        return statement
+
+    # Predicates like P31 and 'url' are predefined in the ORKG, they are returned with their ID as label
+    def entityOrPlaceholder(self, entityId):
+        return self.entities.get(entityId, {'id': entityId, 'label': entityId})
+
+    # Create a resource with its values, as used by papers and objects: {predicateId: [{'text': ...} or {'@id': ...}]}
+    def createResourceWithValues(self, name, classes, values):
+        resource = self.createEntity('resource', name, classes)
+
+        for predicateId, predicateValues in values.items():
+            for value in predicateValues:
+                if 'text' in value:
+                    objectId = self.createEntity('literal', str(value['text']))['id']
+                elif '@id' in value:
+                    objectId = value['@id']
+                else:
+                    continue
+
+                self.createStatement(resource['id'], predicateId, objectId)
+
+        return resource
+
+class FakeClient:
+    def __init__(self, orkg):
+        self.orkg = orkg
+
+class FakeResources(FakeClient):
+    def get(self, q='', exact=False, **params):
+        return self.orkg.request('resources.get', lambda: self.orkg.findEntities('resource', q, exact))
+
+    def add(self, label='', classes=None, **params):
+        return self.orkg.request('resources.add', lambda: self.orkg.createEntity('resource', label, classes))
+
+class FakePredicates(FakeClient):
+    def get(self, q='', exact=False, **params):
+        return self.orkg.request('predicates.get', lambda: self.orkg.findEntities('predicate', q, exact))
+
+    def add(self, label='', **params):
+        return self.orkg.request('predicates.add', lambda: self.orkg.createEntity('predicate', label))
+
+class FakeLiterals(FakeClient):
+    def add(self, label='', **params):
+        return self.orkg.request('literals.add', lambda: self.orkg.createEntity('literal', label))
+
+class FakeStatements(FakeClient):
+    def add(self, subject_id, predicate_id, object_id, **params):
+        return self.orkg.request('statements.add', lambda: self.orkg.createStatement(subject_id, predicate_id, object_id))
+
+    def get_by_subject(self, subject_id, **params):
+        return self.orkg.request('statements.get_by_subject', lambda: list(self.orkg.bySubject.get(subject_id, [])))
+
+    def get_by_object(self, object_id, **params):
+        return self.orkg.request('statements.get_by_object', lambda: list(self.orkg.byObject.get(object_id, [])))
+
+class FakePapers(FakeClient):
+    # Add a paper with its metadata and contributions, in the same format as the papers endpoint of the ORKG
+    def add(self, params=None, **kwargs):
+        def addPaper():
+            paper = params['paper']
+            paperResource = self.orkg.createEntity('resource', paper['title'], ['Paper'])
+
+            for author in paper.get('authors', []):
+                self.orkg.createStatement(paperResource['id'], 'P27', self.orkg.createEntity('literal', author['label'])['id'])
+
+            if paper.get('researchField'):
+                self.orkg.createStatement(paperResource['id'], 'P30', paper['researchField'])
+
+            for contribution in paper.get('contributions', []):
+                contributionResource = self.orkg.createResourceWithValues(contribution['name'], ['Contribution'], contribution.get('values', {}))
+                self.orkg.createStatement(paperResource['id'], 'P31', contributionResource['id'])
+
+            return {'id': paperResource['id']}
+
+        return self.orkg.request('papers.add', addPaper)
+
+# The pinned ORKG client has no objects client, objects are posted through its hammock backend instead
+class FakeBackend(FakeClient):
+    def __init__(self, orkg):
+        super().__init__(orkg)
+        self._append_slash = False
+        self.objects = FakeObjectsEndpoint(orkg)
+
+class FakeObjectsEndpoint(FakeClient):
+    def POST(self, json=None, **kwargs):
+        def addObject():
+            resource = json['resource']
+
+            return {'id': self.orkg.createResourceWithValues(resource['name'], resource.get('classes', []), resource.get('values', {}))['id']}
+
+        return self.orkg.request('objects.add', addObject)
+
+class FakeClasses(FakeClient):
+    def get_resource_by_class(self, class_id, page=0, items=20, **params):
+        def listResources():
+            resources = [entity for entity in self.orkg.entities.values() if class_id in entity.get('classes', [])]
+
+            return resources[page * items:(page + 1) * items]
+
+        return self.orkg.request('classes.get_resource_by_class', listResources)
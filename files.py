@@ -0,0 +1,23 @@
+'''
+Helpers for the files that are written by the reference extraction and the graph builder (e.g. the manifest,
+the resolution queue and the write plan).
+'''
+
+import os
+import tempfile
+
+# Write to a temporary file first and move it in place afterwards, so an interrupted run never leaves a partial file behind
+def writeFileAtomic(path, content):
+    fileDescriptor, tempPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+
+    try:
+        if isinstance(content, bytes):
+            with os.fdopen(fileDescriptor, 'wb') as tempFile:
+                tempFile.write(content)
+        else:
+            with os.fdopen(fileDescriptor, 'w', encoding='utf-8') as tempFile:
+                tempFile.write(content)
+        os.replace(tempPath, path)
+    except BaseException:
+        os.remove(tempPath)
+        raise
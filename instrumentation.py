@@ -0,0 +1,211 @@
+'''
+Instrumentation of the reference extraction and the graph builder. The wall time and number of calls are recorded
+per stage (e.g. `loadReferences`, `processPaper`, every GROBID endpoint and every ORKG method like
+`orkg.resources.get`), together with counters like the cache hits and misses of the looked up labels.
+Everything is counted for the whole run and for the table that is processed, the table is kept per thread
+and passed on to the threads that send requests for that table.
+
+The metrics can be printed as summary or exported as JSON or in the Prometheus text format.
+'''
+
+import inspect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+lock = threading.Lock()
+local = threading.local()
+runStats = {} # Name -> [number of calls, seconds]
+tableStats = {} # Table ID -> name -> [number of calls, seconds]
+printTableSummaries = False # Print the summary of a table when processing it has finished
+
+# Add a call (or a number of events) with its duration to the run and the current table
+def record(name, seconds=0, count=1):
+    table_id = currentTable()
+
+    with lock:
+        addStats(runStats, name, count, seconds)
+
+        if table_id is not None:
+            addStats(tableStats.setdefault(table_id, {}), name, count, seconds)
+
+def addStats(stats, name, count, seconds):
+    if name not in stats:
+        stats[name] = [0, 0.0]
+
+    stats[name][0] += count
+    stats[name][1] += seconds
+
+# Count an event without duration, e.g. a cache hit
+def count(name, number=1):
+    record(name, 0, number)
+
+@contextmanager
+def timer(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+# Wrap a function, so every call is timed
+def timed(name, function):
+    def wrapper(*args, **kwargs):
+        with timer(name):
+            return function(*args, **kwargs)
+
+    wrapper.__name__ = getattr(function, '__name__', name)
+
+    return wrapper
+
+# Time every public method of the given clients of the ORKG client (e.g. 'resources'), recorded as 'orkg.resources.get'
+def instrumentClient(client, names, prefix='orkg.'):
+    for name in names:
+        endpoint = getattr(client, name, None)
+        if endpoint is None:
+            continue
+
+        for methodName in dir(endpoint):
+            if methodName.startswith('_'):
+                continue
+
+            method = getattr(endpoint, methodName, None)
+            if inspect.ismethod(method) or inspect.isfunction(method):
+                setattr(endpoint, methodName, timed(prefix + name + '.' + methodName, method))
+
+    return client
+
+def currentTable():
+    return getattr(local, 'table', None)
+
+# Count everything in this thread for the given table
+@contextmanager
+def inTable(table_id):
+    previous = currentTable()
+    local.table = table_id
+    try:
+        yield
+    finally:
+        local.table = previous
+
+# Process a table, the summary of the table is printed afterwards when enabled
+@contextmanager
+def table(table_id):
+    with inTable(table_id):
+        yield
+
+    if printTableSummaries:
+        printSummary('Table ' + str(table_id), table_id)
+
+# Wrap a function that runs in another thread, so it is counted for the table of the thread that submitted it
+def propagate(function):
+    table_id = currentTable()
+
+    if table_id is None:
+        return function
+
+    def wrapper(*args, **kwargs):
+        with inTable(table_id):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+def snapshot():
+    with lock:
+        return {
+            'run': {name: list(values) for name, values in runStats.items()},
+            'tables': {table_id: {name: list(values) for name, values in stats.items()} for table_id, stats in tableStats.items()}
+        }
+
+def reset():
+    with lock:
+        runStats.clear()
+        tableStats.clear()
+
+# Add the metrics of another process
+def merge(other):
+    with lock:
+        for name, (calls, seconds) in other['run'].items():
+            addStats(runStats, name, calls, seconds)
+
+        for table_id, stats in other['tables'].items():
+            for name, (calls, seconds) in stats.items():
+                addStats(tableStats.setdefault(table_id, {}), name, calls, seconds)
+
+# Run a function in a worker process and return its result together with the metrics of the call, which can be merged in the main process
+def collect(function, *args):
+    reset()
+    result = function(*args)
+
+    return result, snapshot()
+
+def printSummary(title, table_id=None):
+    stats = snapshot()
+    stats = stats['run'] if table_id is None else stats['tables'].get(table_id, {})
+
+    if len(stats) == 0:
+        return
+
+    print(title + ':')
+
+    # Slowest stages first, counters without duration last
+    for name, (calls, seconds) in sorted(stats.items(), key=lambda item: (-item[1][1], item[0])):
+        line = '  ' + name + ': ' + str(calls) + ' calls'
+
+        if seconds > 0:
+            line += ', ' + str(round(seconds, 3)) + 's (' + str(round(seconds / calls * 1000, 1)) + ' ms per call)'
+
+        print(line)
+
+def toJson():
+    stats = snapshot()
+
+    def convert(values):
+        return {name: {'calls': calls, 'seconds': round(seconds, 6)} for name, (calls, seconds) in sorted(values.items())}
+
+    return {
+        'run': convert(stats['run']),
+        'tables': {str(table_id): convert(values) for table_id, values in sorted(stats['tables'].items(), key=lambda item: str(item[0]))}
+    }
+
+def toPrometheus():
+    stats = snapshot()
+    lines = []
+
+    for metric, description, index in [('calls', 'Number of calls', 0), ('seconds', 'Wall time in seconds', 1)]:
+        lines.append('# HELP survey_import_' + metric + '_total ' + description + ' per stage in the whole run')
+        lines.append('# TYPE survey_import_' + metric + '_total counter')
+        for name, values in sorted(stats['run'].items()):
+            lines.append('survey_import_' + metric + '_total{name="' + escapeLabel(name) + '"} ' + str(values[index]))
+
+        lines.append('# HELP survey_import_table_' + metric + '_total ' + description + ' per stage and table')
+        lines.append('# TYPE survey_import_table_' + metric + '_total counter')
+        for table_id, tableValues in sorted(stats['tables'].items(), key=lambda item: str(item[0])):
+            for name, values in sorted(tableValues.items()):
+                lines.append('survey_import_table_' + metric + '_total{name="' + escapeLabel(name) + '",table="' + escapeLabel(table_id) + '"} ' + str(values[index]))
+
+    return '\n'.join(lines) + '\n'
+
+def escapeLabel(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Write the metrics to a file, as JSON or in the Prometheus text format (default: based on the extension of the file)
+def export(path, outputFormat=None):
+    if outputFormat is None:
+        outputFormat = 'prometheus' if path.endswith('.prom') or path.endswith('.txt') else 'json'
+
+    with open(path, 'w', encoding='utf-8') as outputFile:
+        if outputFormat == 'prometheus':
+            outputFile.write(toPrometheus())
+        else:
+            json.dump(toJson(), outputFile, indent=2)
+
+# Print and export the metrics at the end of a run, as set by the --metrics-summary, --metrics and --metrics-format options
+def report(args):
+    if args.metrics_summary:
+        printSummary('Metrics of the run')
+
+    if args.metrics:
+        export(args.metrics, args.metrics_format)
+        print('Metrics written to ' + args.metrics)
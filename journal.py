@@ -0,0 +1,62 @@
+'''
+Write-ahead journal of the graph import. Every completed ORKG write of a table (paper, contribution, comparison)
+is appended as a JSON line and flushed to disk before continuing, so an interrupted import can be resumed
+without adding the same papers, contributions or comparison again.
+'''
+
+import hashlib
+import json
+import os
+import threading
+
+class ImportJournal:
+    # When resume is False, the existing journal of the table is discarded and the import starts from the beginning
+    def __init__(self, path, resume=True):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.comparisonId = None
+
+        if resume and os.path.exists(path):
+            with open(path, encoding='utf-8') as journalFile:
+                for line in journalFile:
+                    try:
+                        self.apply(json.loads(line))
+                    except ValueError:
+                        pass # The last line can be incomplete when the import was interrupted while writing
+
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    # Key of a row of the table, based on its position and content so changed rows are imported again
+    @staticmethod
+    def rowKey(index, insert_paper):
+        content = json.dumps(insert_paper, sort_keys=True, default=str).encode('utf-8')
+
+        return str(index) + ':' + hashlib.sha1(content).hexdigest()
+
+    def apply(self, record):
+        if record['type'] == 'comparison':
+            self.comparisonId = record['comparisonId']
+        else:
+            self.rows.setdefault(record['row'], {}).update(record)
+
+    # Append a record and make sure it is on disk before the next write to the ORKG
+    def record(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.apply(record)
+
+    # Get what is already written for a row, e.g. {'paperId': ..., 'contributionId': ..., 'contributionIds': [...]}
+    def row(self, rowKey):
+        with self.lock:
+            return dict(self.rows.get(rowKey, {}))
+
+    def close(self):
+        with self.lock:
+            self.file.close()
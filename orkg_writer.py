@@ -0,0 +1,105 @@
+'''
+Execution layer for the ORKG API calls of the graph builder. All calls are rate limited with a token bucket
+and retried with an increasing delay when the ORKG is rate limiting (HTTP 429), has a server error (HTTP 5xx) or returns
+an error page that is not JSON (e.g. from a proxy).
+Independent calls and tasks (e.g. different papers) run at the same time on pools with a limited number of workers,
+the order of dependent calls is up to the caller (e.g. create a contribution before adding statements to it).
+'''
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import instrumentation
+
+# Errors of a response that is not JSON, since requests 2.27 its own error is raised which is also a RequestException
+JSON_ERRORS = (json.JSONDecodeError,) + ((requests.exceptions.JSONDecodeError,) if hasattr(requests.exceptions, 'JSONDecodeError') else ())
+
+class TokenBucket:
+    # rate is the number of tokens added per second, capacity is the maximum number of tokens that can be used at once
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Wait until a token is available and use it
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                waitTime = (1 - self.tokens) / self.rate
+
+            time.sleep(waitTime)
+
+class OrkgWriter:
+    # rate is the maximum number of requests per second (0 for no limit)
+    def __init__(self, workers=4, rate=0, maxRetries=5, retryDelay=1):
+        self.workers = max(1, workers)
+        self.bucket = TokenBucket(rate, max(1, rate)) if rate > 0 else None
+        self.maxRetries = maxRetries
+        self.retryDelay = retryDelay
+
+        # Tasks can wait for calls, so they use a different pool to prevent them from waiting for each other
+        self.taskExecutor = ThreadPoolExecutor(max_workers=self.workers)
+        self.callExecutor = ThreadPoolExecutor(max_workers=self.workers)
+
+    # Call an ORKG client method, e.g. call(orkg.statements.add, subject_id=..., predicate_id=..., object_id=...)
+    def call(self, method, *args, **kwargs):
+        for attempt in range(self.maxRetries + 1):
+            if self.bucket is not None:
+                with instrumentation.timer('orkg.rateLimitWait'):
+                    self.bucket.acquire()
+
+            try:
+                response = method(*args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.maxRetries:
+                    raise
+            # The client fails when an error response is not JSON (e.g. HTML from a proxy)
+            except JSON_ERRORS:
+                if attempt == self.maxRetries:
+                    raise
+            # Other ValueErrors are retried as well (e.g. the JSON error of simplejson), except invalid requests (e.g. a wrong URL)
+            except ValueError as e:
+                if attempt == self.maxRetries or isinstance(e, requests.exceptions.RequestException):
+                    raise
+            else:
+                statusCode = getattr(response, 'status_code', None)
+
+                if not self.isRetryable(statusCode) or attempt == self.maxRetries:
+                    return response
+
+            instrumentation.count('orkg.retries')
+            time.sleep(self.retryDelay * 2 ** attempt)
+
+    @staticmethod
+    def isRetryable(statusCode):
+        try:
+            statusCode = int(statusCode)
+        except (TypeError, ValueError):
+            return False
+
+        return statusCode == 429 or statusCode >= 500
+
+    # Start a call in the background, returns a future with the response
+    def submit(self, method, *args, **kwargs):
+        # The call is counted for the table of the thread that submits it
+        return self.callExecutor.submit(instrumentation.propagate(self.call), method, *args, **kwargs)
+
+    # Run a task for each item at the same time, returns the results in the same order as the items
+    def runTasks(self, task, items):
+        return list(self.taskExecutor.map(instrumentation.propagate(task), items))
+
+    def shutdown(self):
+        self.taskExecutor.shutdown()
+        self.callExecutor.shutdown()
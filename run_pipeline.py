@@ -0,0 +1,229 @@
+'''
+Runs the reference extraction (step 4) and the graph builder (step 5) as a single pipeline. Every paper flows
+through the stages on its own: GROBID parsing, resolving the references of its tables, compiling the write plan
+of each table and writing it to the ORKG. The stages run at the same time in their own threads, connected by
+bounded queues, so a table can be imported while GROBID is still parsing later PDFs. The pipeline is as fast as
+its slowest stage instead of the sum of all stages.
+
+The options of both scripts can be used (e.g. `--grobid-workers` and `--write-workers`), missing references are
+always added to the resolution queue.
+'''
+
+import argparse
+import importlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from termcolor import colored
+import instrumentation
+
+extraction = importlib.import_module('4_reference_extraction')
+graphBuilder = importlib.import_module('5_build_graph')
+
+DONE = None # Put on a queue after the last item, so the next stage knows it can stop
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pipeline of the reference extraction and graph builder')
+    parser.add_argument("--queue-size", type=int, default=4, help='Maximum number of papers or tables that wait between two stages')
+    args, otherArgs = parser.parse_known_args(argv)
+
+    # The other options belong to one (or both) of the scripts, options that neither script knows are an error
+    extractionArgs, extractionUnknown = extraction.parseArguments(otherArgs, known=True)
+    graphArgs, graphUnknown = graphBuilder.parseArguments(otherArgs, known=True)
+    unknown = [arg for arg in extractionUnknown if arg in graphUnknown]
+
+    if len(unknown) > 0:
+        parser.error('unrecognized arguments: ' + ' '.join(unknown))
+
+    if extractionArgs.resolve_queue or graphArgs.plan_only or graphArgs.apply_plan:
+        parser.error('--resolve-queue, --plan-only and --apply-plan are not supported by the pipeline, run the scripts separately')
+
+    return runPipeline(extractionArgs, graphArgs, args.queue_size)
+
+def runPipeline(extractionArgs, graphArgs, queueSize):
+    data_dir = extractionArgs.dir
+    settingsFile = graphArgs.settings
+    data_dir = './data/' if not data_dir else data_dir
+    settingsFile = './tables.csv' if not settingsFile else settingsFile
+    queueFile = data_dir + 'resolutionQueue.jsonl' if not extractionArgs.queue else extractionArgs.queue
+    manifestFile = data_dir + 'manifest.json' if not extractionArgs.manifest else extractionArgs.manifest
+    journalDir = data_dir + 'journal/' if not graphArgs.journal_dir else graphArgs.journal_dir
+
+    # Asking for missing references would stop all stages, and the raw references can't be collected for all tables at once
+    if not extractionArgs.non_interactive:
+        print(colored('Running as pipeline, missing references are added to the resolution queue', 'yellow'))
+        extractionArgs.non_interactive = True
+
+    if extractionArgs.batch_citations == 'all':
+        extractionArgs.batch_citations = 'table'
+
+    instrumentation.printTableSummaries = graphArgs.metrics_summary
+    extraction.openCache(extractionArgs)
+    graphBuilder.openOrkg(graphArgs, journalDir)
+
+    resolutionQueue = extraction.loadResolutionQueue(queueFile)
+    manifest = extraction.loadManifest(manifestFile)
+    settings_df = pd.read_csv(settingsFile, dtype=str)
+    tableIds = set(settings_df['tableID'])
+    stats = extraction.newStats()
+    heldBack = []
+
+    # Group the tables per paper, only papers with a PDF can be processed
+    paperTables = {}
+    for filename, paperId in extraction.listTables(data_dir):
+        if os.path.exists(data_dir + paperId + '.pdf'):
+            paperTables.setdefault(paperId, []).append(filename)
+
+    # Resolve the references of the tables of a paper, the tables that are listed in the settings are passed on
+    # Tables with references that are not found are held back, they are imported with 5_build_graph.py after resolving the queue
+    def resolveReferences(item):
+        paperId, filenames = item
+
+        for filename, tableStats, unresolvedReferences, manifestEntry in extraction.processTables(data_dir, paperId, filenames, extractionArgs, {}, manifest):
+            extraction.mergeStats(stats, tableStats)
+            manifest[filename] = manifestEntry
+            extraction.updateResolutionQueue(resolutionQueue, filename, unresolvedReferences)
+
+            if extraction.tableId(filename) not in tableIds:
+                continue
+
+            if unresolvedReferences is None or len(unresolvedReferences) > 0:
+                print(colored('Table ' + filename + ' is not imported, not all references are found', 'yellow'))
+                heldBack.append(extraction.tableId(filename))
+                continue
+
+            yield extraction.tableId(filename)
+
+    def compilePlan(table_id):
+        yield table_id, graphBuilder.compilePlan(data_dir, settings_df[settings_df['tableID'] == table_id], graphArgs.store)
+
+    def writePlan(item):
+        table_id, plan = item
+        graphBuilder.executePlan(plan, journalDir, graphArgs)
+
+        yield table_id
+
+    parsedPapers = queue.Queue(maxsize=max(1, queueSize))
+    resolvedTables = queue.Queue(maxsize=max(1, queueSize))
+    plannedTables = queue.Queue(maxsize=max(1, queueSize))
+    writtenTables = queue.Queue()
+    busy = {}
+
+    start = time.perf_counter()
+    threads = [
+        startThread('parse', parseStage, (data_dir, paperTables, extractionArgs.grobid_workers), parsedPapers, busy),
+        startStage('resolve', resolveReferences, parsedPapers, resolvedTables, busy),
+        startStage('plan', compilePlan, resolvedTables, plannedTables, busy),
+        startStage('write', writePlan, plannedTables, writtenTables, busy)
+    ]
+
+    tables = 0
+    while writtenTables.get() is not DONE:
+        tables += 1
+
+    for thread in threads:
+        thread.join()
+
+    seconds = time.perf_counter() - start
+    graphBuilder.writer.shutdown()
+
+    extraction.saveManifest(manifestFile, manifest)
+    extraction.saveResolutionQueue(queueFile, resolutionQueue)
+
+    if len(resolutionQueue) > 0:
+        print(colored(str(len(resolutionQueue)) + ' references are not found, add them with: python 4_reference_extraction.py --resolve-queue', 'yellow'))
+
+    if len(heldBack) > 0:
+        print(colored(str(len(heldBack)) + ' tables are not imported (' + ', '.join(sorted(heldBack)) + '), import them with: python 5_build_graph.py after resolving the queue', 'yellow'))
+
+    print('Found paper:', str(stats['papers']))
+    print('Found references:', str(stats['foundReferences']))
+    print('Not found references:', str(stats['notFoundReferences']))
+    print('Imported ' + str(tables) + ' tables in ' + str(round(seconds, 1)) + 's')
+
+    # The busy time of each stage shows which stage limits the pipeline
+    for stage, stageSeconds in busy.items():
+        print('  ' + stage + ': busy ' + str(round(stageSeconds, 1)) + 's')
+        instrumentation.record('pipeline.' + stage, stageSeconds)
+
+    instrumentation.report(graphArgs)
+
+    return {'tables': tables, 'heldBack': heldBack, 'seconds': seconds, 'busy': busy, 'stats': stats}
+
+# Parse the PDFs with GROBID, papers are passed on as soon as they are parsed (or immediately when they are parsed already)
+def parseStage(data_dir, paperTables, workers, outputQueue):
+    pending = [paperId for paperId in paperTables if not os.path.exists(data_dir + 'parsedPaper-' + paperId + '.xml')]
+
+    if len(pending) > 0:
+        print('Parsing ' + str(len(pending)) + ' full papers with GROBID...')
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(extraction.parsePaper, data_dir, paperId): paperId for paperId in pending}
+
+        for paperId, filenames in paperTables.items():
+            if paperId not in pending:
+                outputQueue.put((paperId, filenames))
+
+        for future in as_completed(futures):
+            paperId = futures[future]
+            try:
+                future.result()
+                print('Parsed paper ' + paperId + '.pdf')
+                outputQueue.put((paperId, paperTables[paperId]))
+            except Exception as e:
+                print(colored('Error: parsing ' + paperId + '.pdf failed (' + str(e) + ')', 'red'))
+
+# Run a function in its own thread, DONE is always put on the output queue when it returns
+def startThread(name, function, args, outputQueue, busy):
+    def run():
+        start = time.perf_counter()
+        try:
+            function(*args, outputQueue)
+        except Exception as e:
+            print(colored('Error: ' + name + ' stage failed (' + str(e) + ')', 'red'))
+        finally:
+            busy[name] = time.perf_counter() - start
+            outputQueue.put(DONE)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+
+    return thread
+
+# Run a stage in its own thread: every item of the input queue is passed to the function, the items it yields are put on the output queue
+# A failing item is skipped, so the other stages keep running
+def startStage(name, function, inputQueue, outputQueue, busy):
+    busy[name] = 0
+
+    def run():
+        try:
+            while True:
+                item = inputQueue.get()
+
+                if item is DONE:
+                    break
+
+                start = time.perf_counter()
+                try:
+                    results = list(function(item))
+                except Exception as e:
+                    print(colored('Error: ' + name + ' stage failed for ' + str(item[0] if isinstance(item, tuple) else item) + ' (' + str(e) + ')', 'red'))
+                    results = []
+
+                busy[name] += time.perf_counter() - start
+
+                for result in results:
+                    outputQueue.put(result)
+        finally:
+            outputQueue.put(DONE)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+
+    return thread
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,118 @@
 from dotenv import load_dotenv
 from pathlib import Path  
 import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from orkg import ORKG
+from hammock import Hammock
+import instrumentation
 
 env_path = Path('.') / '.env'
 load_dotenv(dotenv_path=env_path)
 
+session = None
+sessionLock = threading.Lock()
+
+# Clients of the ORKG client that are instrumented
+ORKG_CLIENTS = ['resources', 'predicates', 'literals', 'statements', 'papers', 'objects', 'classes']
+
+# HTTP adapter that uses a default timeout for every request that doesn't set one
+class TimeoutHTTPAdapter(HTTPAdapter):
+    def __init__(self, timeout=None, *args, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+
+        return super().send(request, **kwargs)
+
+# The ORKG client sets the trailing slash flag on its shared hammock instance right before every request, so with
+# requests from multiple threads the flag of one request could be used by another. The flag is kept per thread instead,
+# the child instances that build the URL are copies that share the same thread local value
+class ThreadSafeHammock(Hammock):
+    @property
+    def _append_slash(self):
+        return getattr(self._appendSlashPerThread, 'value', self._appendSlashDefault)
+
+    @_append_slash.setter
+    def _append_slash(self, value):
+        self._appendSlashPerThread.value = value
+
+    @classmethod
+    def convert(cls, hammock):
+        appendSlash = hammock.__dict__.pop('_append_slash', False)
+        hammock._appendSlashPerThread = threading.local()
+        hammock._appendSlashDefault = appendSlash
+        hammock.__class__ = cls
+
+        return hammock
+
+# Create an adapter with a connection pool that keeps connections alive between requests
+# Only failed connections are retried, requests that reached the server are retried by the callers (e.g. GROBID 503, ORKG 429)
+def init_adapter(timeout, retries, pool_size):
+    retry = Retry(total=None, connect=retries, read=0, status=0, redirect=None, backoff_factor=0.5)
+
+    return TimeoutHTTPAdapter(timeout=timeout, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+# Get the HTTP session that is shared by the GROBID and ORKG requests, the pool size, timeouts and retries are set in the env file
+def init_session():
+    global session
+
+    with sessionLock:
+        if session is None:
+            pool_size = int(os.getenv('HTTP_POOL_SIZE') or 16)
+            retries = int(os.getenv('HTTP_CONNECT_RETRIES') or 3)
+
+            session = requests.Session()
+            session.mount('http://', init_adapter(None, retries, pool_size))
+            session.mount('https://', init_adapter(None, retries, pool_size))
+
+            # The adapter with the longest matching prefix is used, so each API gets its own timeout
+            if os.getenv('GROBID_API'):
+                session.mount(os.getenv('GROBID_API'), init_adapter(float(os.getenv('GROBID_TIMEOUT') or 300), retries, pool_size))
+
+            if os.getenv('ORKG_API'):
+                session.mount(os.getenv('ORKG_API'), init_adapter(float(os.getenv('ORKG_TIMEOUT') or 60), retries, pool_size))
+
+    return session
+
+# Forget the session inherited from the parent process, so a worker process doesn't share its pooled connections
+def reset_session():
+    global session, sessionLock
+    session = None
+    sessionLock = threading.Lock()
+
 # Setup the ORKG API, optionally with user credentials 
 def init_orkg():
     creds = ()
     if os.getenv('ORKG_API_CREDS_EMAIL') != '' and os.getenv('ORKG_API_CREDS_PASSWORD') != '':
         creds = (os.getenv('ORKG_API_CREDS_EMAIL'), os.getenv('ORKG_API_CREDS_PASSWORD'))
         
-    return ORKG(host=os.getenv('ORKG_API'), creds=creds)
+    # Use the in-memory stand-in of the ORKG, e.g. for benchmarks (ORKG_API=fake://?latency=0.01&errors=0.05)
+    if (os.getenv('ORKG_API') or '').startswith('fake'):
+        from fake_orkg import FakeOrkg
+        return instrumentation.instrumentClient(FakeOrkg.fromUrl(os.getenv('ORKG_API')), ORKG_CLIENTS)
+
+    orkg = ORKG(host=os.getenv('ORKG_API'), creds=creds)
+
+    # Send the requests of the ORKG client through the shared session, the client uses a hammock instance for the API calls
+    shared_session = init_session()
+
+    for name in ['core', 'backend', 'simcomp']:
+        client = getattr(orkg, name, None)
+
+        if client is not None and hasattr(client, '_session'):
+            if hasattr(orkg, 'user_agent'):
+                shared_session.headers['User-Agent'] = orkg.user_agent
+
+            client._session = shared_session
+
+        if isinstance(client, Hammock):
+            ThreadSafeHammock.convert(client)
+
+    # Every call of the client is timed and counted per method (e.g. 'orkg.statements.add')
+    return instrumentation.instrumentClient(orkg, ORKG_CLIENTS)
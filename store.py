@@ -0,0 +1,129 @@
+'''
+Typed intermediate store for the tables, stored in a single SQLite file. The reference extraction (step 4) writes
+the tables with their bibliographical metadata and the graph builder (step 5) reads all tables in one scan.
+The metadata is typed: authors are stored as a JSON list (so names with commas stay intact) and the publication
+year and month as integers. The other cells of the tables are stored as text (as they are written in the CSV
+files), in the original column order.
+'''
+
+import json
+import math
+import os
+import sqlite3
+import threading
+
+METADATA_COLUMNS = ['title', 'authors', 'publicationMonth', 'publicationYear', 'doi', 'referenceRaw']
+
+class TableStore:
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tables (tableId TEXT PRIMARY KEY, paperId TEXT, columns TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS metadata (tableId TEXT, row INTEGER, signature TEXT, title TEXT, authors TEXT, publicationMonth INTEGER, publicationYear INTEGER, doi TEXT, referenceRaw TEXT, PRIMARY KEY (tableId, row))')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS cells (tableId TEXT, row INTEGER, position INTEGER, name TEXT, value TEXT, PRIMARY KEY (tableId, row, position))')
+        self.connection.commit()
+
+    # Replace a table, df contains the metadata columns and the other cells, authorLists the list of authors of each row
+    def saveTable(self, tableId, paperId, df, authorLists, signatures):
+        columns = [column for column in df.columns if column not in METADATA_COLUMNS]
+        metadataRows = []
+        cellRows = []
+
+        for row, (index, paper) in enumerate(df.iterrows()):
+            metadataRows.append((
+                tableId,
+                row,
+                signatures[index],
+                toText(paper.get('title')),
+                json.dumps(authorLists[index], ensure_ascii=False),
+                toInteger(paper.get('publicationMonth')),
+                toInteger(paper.get('publicationYear')),
+                toText(paper.get('doi')),
+                toText(paper.get('referenceRaw'))
+            ))
+
+            for position, column in enumerate(columns):
+                value = toText(paper[column])
+
+                if value is not None:
+                    cellRows.append((tableId, row, position, column, value))
+
+        with self.lock:
+            with self.connection:
+                self.connection.execute('DELETE FROM metadata WHERE tableId = ?', (tableId,))
+                self.connection.execute('DELETE FROM cells WHERE tableId = ?', (tableId,))
+                self.connection.execute('INSERT OR REPLACE INTO tables (tableId, paperId, columns) VALUES (?, ?, ?)', (tableId, paperId, json.dumps(columns)))
+                self.connection.executemany('INSERT INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', metadataRows)
+                self.connection.executemany('INSERT INTO cells VALUES (?, ?, ?, ?, ?)', cellRows)
+
+    def hasTable(self, tableId):
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM tables WHERE tableId = ?', (tableId,)).fetchone() is not None
+
+    # Get the authors of the rows of a table by row signature, so the author lists of unchanged rows can be reused
+    def loadAuthors(self, tableId):
+        with self.lock:
+            rows = self.connection.execute('SELECT signature, authors FROM metadata WHERE tableId = ?', (tableId,)).fetchall()
+
+        return {signature: json.loads(authors) for signature, authors in rows}
+
+    # Load the rows of all tables (or only of the given tables) in one scan, returns per table a list of rows
+    # A row is a dict with the metadata followed by the other cells in column order, missing values are None
+    def loadTables(self, tableIds=None):
+        # Only the rows of the given tables are read
+        condition = ''
+        parameters = []
+        if tableIds is not None:
+            parameters = sorted(tableIds)
+            condition = ' WHERE tableId IN (' + ', '.join('?' for tableId in parameters) + ')'
+
+        with self.lock:
+            tables = self.connection.execute('SELECT tableId, columns FROM tables' + condition, parameters).fetchall()
+            metadata = self.connection.execute('SELECT tableId, row, title, authors, publicationMonth, publicationYear, doi, referenceRaw FROM metadata' + condition + ' ORDER BY tableId, row', parameters).fetchall()
+            cells = self.connection.execute('SELECT tableId, row, name, value FROM cells' + condition + ' ORDER BY tableId, row, position', parameters).fetchall()
+
+        columns = {tableId: json.loads(tableColumns) for tableId, tableColumns in tables}
+        rows = {tableId: {} for tableId in columns}
+
+        for tableId, row, title, authors, publicationMonth, publicationYear, doi, referenceRaw in metadata:
+            paper = {
+                'title': title,
+                'authors': json.loads(authors),
+                'publicationMonth': publicationMonth,
+                'publicationYear': publicationYear,
+                'doi': doi,
+                'referenceRaw': referenceRaw
+            }
+            paper.update((column, None) for column in columns[tableId])
+            rows[tableId][row] = paper
+
+        for tableId, row, name, value in cells:
+            rows[tableId][row][name] = value
+
+        return {tableId: [tableRows[row] for row in sorted(tableRows)] for tableId, tableRows in rows.items()}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+def isMissing(value):
+    return value is None or value == '' or (isinstance(value, float) and math.isnan(value))
+
+def toText(value):
+    if isMissing(value):
+        return None
+
+    return str(value)
+
+def toInteger(value):
+    if isMissing(value):
+        return None
+
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,232 @@
+'''
+Benchmark of the reference extraction (step 4) and the graph builder (step 5). The steps run on a copy of the
+data directory, optionally generated with utils_generate_corpus.py, and the graph builder imports into the
+in-memory stand-in of the ORKG (see fake_orkg.py). Every run starts without caches, journals and paper index.
+The stages are timed separately and the results are appended to a JSON lines file, so runs of different versions
+can be compared.
+'''
+
+import argparse
+import importlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from utils_generate_corpus import generateCorpus
+import instrumentation
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the reference extraction and graph builder')
+    parser.add_argument("--dir", default='./data/', help='Data directory that is benchmarked, not used with --generate')
+    parser.add_argument("--settings", default=None, help='Settings CSV of the tables (default: tables.csv in the data directory, or ./tables.csv)')
+    parser.add_argument("--steps", default='extraction,graph', help='Comma separated steps that are benchmarked: extraction (step 4) and/or graph (step 5)')
+    parser.add_argument("--generate", action='store_true', help='Benchmark a synthetic corpus instead of the data directory')
+    parser.add_argument("--papers", type=int, default=10, help='Number of survey papers of the synthetic corpus')
+    parser.add_argument("--tables-per-paper", type=int, default=1, help='Number of tables per survey paper of the synthetic corpus')
+    parser.add_argument("--rows", type=int, default=20, help='Number of rows per table of the synthetic corpus')
+    parser.add_argument("--references", type=int, default=50, help='Number of references per survey paper of the synthetic corpus')
+    parser.add_argument("--key-style", choices=['numeric', 'author-year', 'mixed'], default='numeric', help='Style of the reference keys of the synthetic corpus')
+    parser.add_argument("--miss-rate", type=float, default=0.1, help='Fraction of the rows of the synthetic corpus with a reference key that is not found')
+    parser.add_argument("--latency", type=float, default=0.005, help='Number of seconds every ORKG request takes')
+    parser.add_argument("--error-rate", type=float, default=0, help='Fraction of the ORKG requests that fail with HTTP 503')
+    parser.add_argument("--seed", type=int, default=1, help='Seed for the synthetic corpus and the injected errors')
+    parser.add_argument("--repeat", type=int, default=1, help='Number of runs')
+    parser.add_argument("--output", default='./benchmark_results.jsonl', help='Append the results as JSON lines to this file')
+    args, graphArgs = parser.parse_known_args(argv)
+    steps = [step.strip() for step in args.steps.split(',') if step.strip() != '']
+
+    corpus = None
+    if args.generate:
+        corpus = {
+            'papers': args.papers,
+            'tablesPerPaper': args.tables_per_paper,
+            'rows': args.rows,
+            'references': args.references,
+            'keyStyle': args.key_style,
+            'missRate': args.miss_rate,
+            'seed': args.seed
+        }
+
+    for run in range(args.repeat):
+        result = benchmarkPipeline(args.dir, args.settings, steps, corpus, args.latency, args.error_rate, args.seed, graphArgs)
+        previous = findPreviousResult(args.output, result)
+        printResult(result, previous)
+
+        if args.output:
+            with open(args.output, 'a', encoding='utf-8') as outputFile:
+                outputFile.write(json.dumps(result) + '\n')
+
+# Run the steps once on a copy of the data directory (or a new synthetic corpus)
+def benchmarkPipeline(data_dir, settingsFile, steps, corpus, latency, errorRate, seed, graphArgs=[]):
+    workDir = tempfile.mkdtemp()
+    instrumentation.reset()
+    benchmark_dir = os.path.join(workDir, 'data') + '/'
+
+    result = {
+        'benchmark': 'pipeline',
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'version': gitVersion(),
+        'steps': steps,
+        'corpus': corpus if corpus is not None else os.path.abspath(data_dir),
+        'arguments': list(graphArgs),
+        'latency': latency,
+        'errorRate': errorRate,
+        'stages': {}
+    }
+
+    try:
+        if corpus is not None:
+            generateCorpus(benchmark_dir, corpus['papers'], corpus['tablesPerPaper'], corpus['rows'], corpus['references'], corpus['keyStyle'], corpus['missRate'], corpus['seed'])
+        else:
+            shutil.copytree(data_dir, benchmark_dir)
+
+        if settingsFile is None:
+            settingsFile = benchmark_dir + 'tables.csv' if os.path.exists(benchmark_dir + 'tables.csv') else './tables.csv'
+
+        if 'extraction' in steps:
+            result['extraction'] = benchmarkExtraction(benchmark_dir, workDir, result['stages'])
+
+        if 'graph' in steps:
+            result['graph'] = benchmarkGraphBuilder(benchmark_dir, settingsFile, workDir, latency, errorRate, seed, graphArgs, result['stages'])
+    finally:
+        shutil.rmtree(workDir)
+
+    result['seconds'] = round(sum(result['stages'].values()), 3)
+    result['metrics'] = instrumentation.toJson()['run']
+    result['peakRssMb'] = peakRss()
+
+    return result
+
+# Time the reference extraction: building the reference indexes from the XML and processing the tables
+def benchmarkExtraction(data_dir, workDir, stages):
+    extraction = loadScript('4_reference_extraction')
+    paperIds = sorted(set(paperId for filename, paperId in extraction.listTables(data_dir) if os.path.exists(data_dir + 'parsedPaper-' + paperId + '.xml')))
+
+    start = time.perf_counter()
+    references = sum(len(extraction.loadReferenceIndex(data_dir, paperId)) for paperId in paperIds)
+    stages['references'] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    stats = extraction.main(['--dir', data_dir, '--non-interactive', '--cache-dir', os.path.join(workDir, 'cache')])
+    stages['extraction'] = round(time.perf_counter() - start, 3)
+
+    rows = stats['papers']
+
+    return {
+        'papers': len(paperIds),
+        'references': references,
+        'rows': rows,
+        'foundReferences': stats['foundReferences'],
+        'notFoundReferences': stats['notFoundReferences'],
+        'rowsPerSecond': round(rows / stages['extraction'], 2) if stages['extraction'] > 0 else None,
+        'peakRssMb': peakRss()
+    }
+
+# Time the graph builder: compiling the tables into a write plan and importing the plan into a new fake ORKG
+# Other arguments (e.g. --write-workers) are passed to the graph builder
+def benchmarkGraphBuilder(data_dir, settingsFile, workDir, latency, errorRate, seed, graphArgs, stages):
+    os.environ['ORKG_API'] = 'fake://?latency=' + str(latency) + '&errors=' + str(errorRate) + '&seed=' + str(seed)
+    graphBuilder = loadScript('5_build_graph')
+    planFile = os.path.join(workDir, 'plan.jsonl')
+    argv = [
+        '--dir', data_dir,
+        '--settings', settingsFile,
+        '--plan', planFile,
+        '--journal-dir', os.path.join(workDir, 'journal'),
+        '--label-cache', os.path.join(workDir, 'labels.sqlite'),
+        '--paper-index', os.path.join(workDir, 'papers.sqlite')
+    ] + list(graphArgs)
+
+    start = time.perf_counter()
+    graphBuilder.main(argv + ['--plan-only'])
+    stages['compile'] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    graphBuilder.main(argv + ['--apply-plan', planFile])
+    stages['import'] = round(time.perf_counter() - start, 3)
+
+    orkg = graphBuilder.orkg
+    tables = countResources(orkg, 'Comparison')
+    contributions = countResources(orkg, 'Contribution')
+    requests = orkg.totalRequests()
+
+    return {
+        'tables': tables,
+        'contributions': contributions,
+        'contributionsPerSecond': round(contributions / stages['import'], 2) if stages['import'] > 0 else None,
+        'requests': requests,
+        'requestsPerTable': round(requests / tables, 1) if tables > 0 else None,
+        'requestsPerContribution': round(requests / contributions, 1) if contributions > 0 else None,
+        'errors': sum(orkg.errors.values()),
+        'endpoints': dict(orkg.counters),
+        'peakRssMb': peakRss()
+    }
+
+# Load a fresh copy of a script, so lookups and indexes of earlier runs are not reused
+def loadScript(name):
+    if name in sys.modules:
+        return importlib.reload(sys.modules[name])
+
+    return importlib.import_module(name)
+
+def countResources(orkg, className):
+    return sum(1 for entity in orkg.entities.values() if className in entity.get('classes', []))
+
+# Peak resident memory of the benchmark so far in MB (ru_maxrss is in KB on Linux)
+def peakRss():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def gitVersion():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Find the last result of an earlier run with the same steps, corpus and arguments
+def findPreviousResult(outputFile, result):
+    if not outputFile or not os.path.exists(outputFile):
+        return None
+
+    previous = None
+
+    with open(outputFile, encoding='utf-8') as lines:
+        for line in lines:
+            try:
+                earlier = json.loads(line)
+            except ValueError:
+                continue
+
+            if all(earlier.get(key) == result[key] for key in ['benchmark', 'steps', 'corpus', 'arguments', 'latency', 'errorRate']):
+                previous = earlier
+
+    return previous
+
+def printResult(result, previous=None):
+    print('Benchmark of ' + str(result['version']) + ' took ' + str(result['seconds']) + 's, peak memory ' + str(result['peakRssMb']) + ' MB')
+
+    for stage, seconds in result['stages'].items():
+        line = '  ' + stage + ': ' + str(seconds) + 's'
+
+        if previous is not None and stage in previous.get('stages', {}) and seconds > 0:
+            line += ' (' + str(round(previous['stages'][stage] / seconds, 2)) + 'x compared to ' + str(previous['version']) + ')'
+
+        print(line)
+
+    if 'extraction' in result:
+        extraction = result['extraction']
+        print('Extracted ' + str(extraction['rows']) + ' rows (' + str(extraction['rowsPerSecond']) + ' rows/s), ' + str(extraction['notFoundReferences']) + ' references not found')
+
+    if 'graph' in result:
+        graph = result['graph']
+        print('Imported ' + str(graph['tables']) + ' tables with ' + str(graph['contributions']) + ' contributions (' + str(graph['contributionsPerSecond']) + ' contributions/s)')
+        print('Sent ' + str(graph['requests']) + ' requests (' + str(graph['requestsPerTable']) + ' per table, ' + str(graph['requestsPerContribution']) + ' per contribution), ' + str(graph['errors']) + ' injected errors')
+
+        for endpoint, count in sorted(graph['endpoints'].items()):
+            print('  ' + endpoint + ': ' + str(count))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+'''
+Generate a synthetic corpus for benchmarks: survey tables with reference keys, the GROBID TEI XML of the
+matching survey papers and placeholder PDFs, together with a settings CSV listing the tables. The XML is
+written as if GROBID already parsed the PDFs, so the reference extraction can run without GROBID.
+'''
+
+import argparse
+import csv
+import os
+import random
+from lxml import etree
+
+TEI_NAMESPACE = 'http://www.tei-c.org/ns/1.0'
+TEI = '{' + TEI_NAMESPACE + '}'
+XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+
+SURNAMES = ['Smith', 'Jones', 'Lee', 'Garcia', 'Miller', 'Davis', 'Chen', 'Wang', 'Kumar', 'Novak', 'Rossi', 'Müller', 'Jansen', 'Silva', 'Kim', 'Sato', 'Dubois', 'Nowak', 'Berg', 'Costa']
+FORENAMES = ['Anna', 'Ben', 'Carla', 'David', 'Eva', 'Femi', 'Gita', 'Hugo', 'Ines', 'Jan', 'Kofi', 'Lena', 'Marco', 'Nora', 'Omar', 'Pia']
+WORDS = ['learning', 'graph', 'neural', 'semantic', 'scholarly', 'knowledge', 'retrieval', 'extraction', 'survey', 'model', 'evaluation', 'citation', 'network', 'data', 'analysis', 'personality', 'design', 'participatory']
+METHODS = ['CNN', 'RNN', 'SVM', 'Random forest', 'Logistic regression', 'Transformer', 'k-NN', 'Naive Bayes']
+DATASETS = ['ImageNet', 'MNIST', 'CoNLL-2003', 'SQuAD', 'Twitter corpus', 'Facebook corpus', 'Own dataset']
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic corpus generator')
+    parser.add_argument("--dir", default='./benchmark_data/', help='Directory the corpus is written to')
+    parser.add_argument("--papers", type=int, default=10, help='Number of survey papers')
+    parser.add_argument("--tables-per-paper", type=int, default=1, help='Number of tables per survey paper')
+    parser.add_argument("--rows", type=int, default=20, help='Number of rows per table')
+    parser.add_argument("--references", type=int, default=50, help='Number of references per survey paper')
+    parser.add_argument("--key-style", choices=['numeric', 'author-year', 'mixed'], default='numeric', help='Style of the reference keys in the tables')
+    parser.add_argument("--miss-rate", type=float, default=0.1, help='Fraction of the rows with a reference key that is not in the paper')
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    summary = generateCorpus(args.dir, args.papers, args.tables_per_paper, args.rows, args.references, args.key_style, args.miss_rate, args.seed)
+
+    print('Generated ' + str(summary['tables']) + ' tables with ' + str(summary['rows']) + ' rows for ' + str(summary['papers']) + ' papers in ' + args.dir)
+
+# Generate the corpus, returns the number of papers, tables and rows
+def generateCorpus(data_dir, papers=10, tablesPerPaper=1, rows=20, references=50, keyStyle='numeric', missRate=0.1, seed=1):
+    generator = random.Random(seed)
+
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+
+    tables = []
+
+    for paperNumber in range(1, papers + 1):
+        paperId = 'paper' + str(paperNumber)
+        paperReferences = [generateReference(generator) for i in range(references)]
+        paperKeyStyle = keyStyle if keyStyle != 'mixed' else generator.choice(['numeric', 'author-year'])
+
+        writeTei(os.path.join(data_dir, 'parsedPaper-' + paperId + '.xml'), paperId, paperReferences, paperKeyStyle)
+        writePdf(os.path.join(data_dir, paperId + '.pdf'))
+
+        for tableNumber in range(1, tablesPerPaper + 1):
+            tableId = paperId if tableNumber == 1 else paperId + '.' + str(tableNumber)
+            writeTable(os.path.join(data_dir, tableId + '.csv'), generator, paperReferences, paperKeyStyle, rows, missRate)
+            tables.append({
+                'tableID': tableId,
+                'problem': ' '.join(generator.sample(WORDS, 2)).capitalize(),
+                'title': 'Comparison of ' + ' '.join(generator.sample(WORDS, 3)),
+                'originalTableNumber': tableNumber,
+                'reference': '10.5555/' + paperId
+            })
+
+    with open(os.path.join(data_dir, 'tables.csv'), 'w', newline='', encoding='utf-8') as settingsFile:
+        writer = csv.DictWriter(settingsFile, fieldnames=['tableID', 'problem', 'title', 'originalTableNumber', 'reference'])
+        writer.writeheader()
+        writer.writerows(tables)
+
+    return {'papers': papers, 'tables': len(tables), 'rows': len(tables) * rows}
+
+def generateReference(generator):
+    authors = [(generator.choice(FORENAMES), generator.choice(SURNAMES)) for i in range(generator.choice([1, 1, 2, 3, 4]))]
+    year = generator.randint(1995, 2020)
+
+    return {
+        'title': ' '.join(generator.choice(WORDS) for i in range(generator.randint(4, 9))).capitalize(),
+        'authors': authors,
+        'year': year,
+        'month': generator.choice([None, generator.randint(1, 12)]),
+        'doi': generator.choice([None, '10.' + str(generator.randint(1000, 9999)) + '/' + str(generator.randint(100000, 999999))])
+    }
+
+# The citation of a reference in the text, e.g. "[12]", "(Smith, 2015)", "(Smith and Jones, 2015)" or "(Smith et al., 2015)"
+def citationText(reference, number, keyStyle):
+    if keyStyle == 'numeric':
+        return '[' + str(number) + ']'
+
+    return '(' + authorKey(reference) + ', ' + str(reference['year']) + ')'
+
+# The author part of an author-year key, as it is written in the tables
+def authorKey(reference):
+    surnames = [surname for forename, surname in reference['authors']]
+
+    if len(surnames) == 1:
+        return surnames[0]
+    if len(surnames) == 2:
+        return surnames[0] + ' and ' + surnames[1]
+
+    return surnames[0] + ' et al.'
+
+def writeTei(path, paperId, references, keyStyle):
+    root = etree.Element(TEI + 'TEI', nsmap={None: TEI_NAMESPACE})
+    header = etree.SubElement(root, TEI + 'teiHeader')
+    headerTitle = etree.SubElement(etree.SubElement(etree.SubElement(header, TEI + 'fileDesc'), TEI + 'titleStmt'), TEI + 'title')
+    headerTitle.text = 'Survey ' + paperId
+
+    text = etree.SubElement(root, TEI + 'text')
+    body = etree.SubElement(etree.SubElement(text, TEI + 'body'), TEI + 'div')
+
+    # Cite every reference once in the body, a few citations per paragraph
+    for start in range(0, len(references), 5):
+        paragraph = etree.SubElement(body, TEI + 'p')
+        paragraph.text = 'As shown in earlier work '
+
+        for number in range(start, min(start + 5, len(references))):
+            ref = etree.SubElement(paragraph, TEI + 'ref', type='bibr', target='#b' + str(number))
+            ref.text = citationText(references[number], number + 1, keyStyle)
+            ref.tail = ' and '
+
+    listBibl = etree.SubElement(etree.SubElement(etree.SubElement(text, TEI + 'back'), TEI + 'div'), TEI + 'listBibl')
+
+    for number, reference in enumerate(references):
+        biblStruct = etree.SubElement(listBibl, TEI + 'biblStruct')
+        biblStruct.set(XML_ID, 'b' + str(number))
+
+        analytic = etree.SubElement(biblStruct, TEI + 'analytic')
+        title = etree.SubElement(analytic, TEI + 'title', level='a', type='main')
+        title.text = reference['title']
+
+        for forename, surname in reference['authors']:
+            persName = etree.SubElement(etree.SubElement(analytic, TEI + 'author'), TEI + 'persName')
+            etree.SubElement(persName, TEI + 'forename', type='first').text = forename
+            etree.SubElement(persName, TEI + 'surname').text = surname
+
+        if reference['doi'] is not None:
+            etree.SubElement(analytic, TEI + 'idno', type='DOI').text = reference['doi']
+
+        monogr = etree.SubElement(biblStruct, TEI + 'monogr')
+        etree.SubElement(monogr, TEI + 'title', level='j').text = 'Journal of ' + reference['title'].split(' ')[0]
+        when = str(reference['year']) + ('-' + str(reference['month']).zfill(2) if reference['month'] is not None else '')
+        etree.SubElement(etree.SubElement(monogr, TEI + 'imprint'), TEI + 'date', type='published', when=when)
+
+        rawReference = etree.SubElement(biblStruct, TEI + 'note', type='raw_reference')
+        rawReference.text = ', '.join(forename[0] + '. ' + surname for forename, surname in reference['authors']) + '. ' + reference['title'] + '. ' + str(reference['year'])
+
+    etree.ElementTree(root).write(path, xml_declaration=True, encoding='UTF-8')
+
+# GROBID is not used for the synthetic corpus, but the reference extraction only processes tables that have a PDF
+def writePdf(path):
+    with open(path, 'wb') as pdfFile:
+        pdfFile.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n')
+
+def writeTable(path, generator, references, keyStyle, rows, missRate):
+    with open(path, 'w', newline='', encoding='utf-8') as tableFile:
+        writer = csv.writer(tableFile)
+        writer.writerow(['Reference', 'Year', 'Method', '[R]Dataset', 'Score', 'referenceRaw'])
+
+        for row in range(rows):
+            number = generator.randrange(len(references))
+            reference = references[number]
+
+            # Rows with a key that is not cited in the paper
+            if generator.random() < missRate:
+                if keyStyle == 'numeric':
+                    key = str(len(references) + 1 + row)
+                else:
+                    key = 'Unknown' + str(row)
+            else:
+                key = str(number + 1) if keyStyle == 'numeric' else authorKey(reference)
+
+            writer.writerow([key, reference['year'], generator.choice(METHODS), generator.choice(DATASETS), round(generator.random(), 3), ''])
+
+if __name__ == "__main__":
+    main()
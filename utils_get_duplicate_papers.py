@@ -2,7 +2,7 @@ import requests
 from orkg import ORKG
 from habanero import Crossref
 import json
-import pandas as pd 
+import pandas as pd
 from tei_reader import TeiReader
 from lxml import etree
 import string
@@ -10,43 +10,190 @@ import argparse
 from termcolor import colored
 import re
 import os.path
+import unicodedata
+import zlib
+import numpy as np
 
 vocab = dict()
 cr = Crossref()
 
+# Large prime for the MinHash permutations, shingle hashes are taken modulo this prime so the products fit in 64 bits
+MINHASH_PRIME = (1 << 31) - 1
+
 def main():
-    data_dir = './data/' 
-    directory = os.fsencode(data_dir)
+    parser = argparse.ArgumentParser(description='Duplicate paper detection')
+    parser.add_argument("--dir", default=None)
+    parser.add_argument("--output", default='./duplicates.json', help='File of the JSON report with the clusters of duplicate papers')
+    parser.add_argument("--threshold", type=float, default=0.8, help='Minimal similarity (Jaccard index of the title trigrams, between 0 and 1) of titles in the same cluster')
+    parser.add_argument("--hashes", type=int, default=64, help='Number of MinHash hashes per title')
+    parser.add_argument("--bands", type=int, default=8, help='Number of LSH bands, more bands find titles that are less similar but compare more candidates')
+    args = parser.parse_args()
+    data_dir = args.dir
+    data_dir = './data/' if not data_dir else data_dir
+
+    rows = loadRows(data_dir)
+    clusters = findDuplicates(rows, args.threshold, args.hashes, args.bands)
+
+    # Print the papers with the same title but different citation keys in the same file (which is an indication that the reference extraction went wrong)
+    # Only the same (normalised) titles are compared here, similar titles with different keys can be different papers (e.g. part 1 and part 2)
+    for (csvFile, title), citationKeys in findKeysPerTitle(rows).items():
+        if len(citationKeys) > 1:
+            print(str(len(citationKeys)) + ' : ' + csvFile + ' : ' + title)
 
-    paper_titles = {}
-    duplicates = {}
+    with open(args.output, 'w', encoding='utf-8') as reportFile:
+        json.dump({'rows': len(rows), 'clusters': clusters}, reportFile, indent=2, ensure_ascii=False)
 
-    # Make a dict with all files, paper titles and their respective reference keys
-    for file in os.listdir(directory):
+    print('Found ' + str(len(clusters)) + ' papers that occur more than once in ' + str(len(rows)) + ' rows, report written to ' + args.output)
+
+# Load the title, citation key and DOI of all rows with a title from all CSV files
+def loadRows(data_dir):
+    rows = []
+
+    for file in sorted(os.listdir(os.fsencode(data_dir))):
         filename = os.fsdecode(file)
-        if filename.endswith('.csv'): 
-            df = pd.read_csv(data_dir + filename) 
-            papers = df.iloc
-
-            
-            for paper in papers:
-                if filename not in paper_titles:
-                    paper_titles[filename] = {}
-
-                if paper['title'] not in paper_titles[filename]:
-                    paper_titles[filename][paper['title']] = []
-                
-                if paper['Reference'] not in paper_titles[filename][paper['title']]:
-                    paper_titles[filename][paper['title']].append(paper['Reference'])
-    
-    # Count and print the files with duplicate paper titles but with different citation keys 
-    duplicate = 0
-    for csvFile in paper_titles:
-        for paper in paper_titles[csvFile]:    
-            if len(paper_titles[csvFile][paper]) > 1 and paper == paper:
-                duplicates = len(paper_titles[csvFile][paper])
-                print(str(duplicates) + ' : ' + csvFile +' : ' + str(paper))
-   
+        if filename.endswith('.csv'):
+            df = pd.read_csv(data_dir + filename, dtype=str)
+
+            for paper in df.iloc:
+                title = paper.get('title')
+
+                if not isinstance(title, str) or normaliseTitle(title) == '':
+                    continue
+
+                rows.append({
+                    'file': filename,
+                    'title': title,
+                    'reference': valueOrNone(paper.get('Reference')),
+                    'doi': valueOrNone(paper.get('doi'))
+                })
+
+    return rows
+
+def valueOrNone(value):
+    return value if isinstance(value, str) and value != '' else None
+
+# Compare titles without case, accents, punctuation and repeated whitespace
+def normaliseTitle(title):
+    title = unicodedata.normalize('NFKD', title)
+    title = ''.join(character for character in title if not unicodedata.combining(character))
+    title = re.sub('[^0-9a-z]+', ' ', title.lower())
+
+    return ' '.join(title.split())
+
+def getShingles(title):
+    title = ' ' + title + ' '
+    return set(title[i:i + 3] for i in range(len(title) - 2))
+
+# Get the citation keys of each title per file, titles are grouped by their normalised title and the first spelling is used
+def findKeysPerTitle(rows):
+    keysPerTitle = {}
+    spellings = {}
+
+    for row in rows:
+        group = (row['file'], normaliseTitle(row['title']))
+        title = spellings.setdefault(group, row['title'])
+        keys = keysPerTitle.setdefault((row['file'], title), [])
+
+        if row['reference'] is not None and row['reference'] not in keys:
+            keys.append(row['reference'])
+
+    return keysPerTitle
+
+# Find clusters of rows with the same or a similar title. Only titles that share an LSH bucket are compared,
+# so the number of comparisons grows roughly linear with the number of titles instead of quadratic
+def findDuplicates(rows, threshold, hashes, bands):
+    # Rows with the same normalised title are always in the same cluster, so only the distinct titles are hashed
+    titleRows = {}
+    for index, row in enumerate(rows):
+        titleRows.setdefault(normaliseTitle(row['title']), []).append(index)
+
+    titles = list(titleRows)
+    shingles = [getShingles(title) for title in titles]
+    signatures = minHashSignatures(shingles, hashes)
+
+    clusters = UnionFind(len(titles))
+    rowsPerBand = max(1, hashes // bands)
+    comparedPairs = set()
+
+    for start in range(0, hashes - rowsPerBand + 1, rowsPerBand):
+        buckets = {}
+
+        for titleIndex in range(len(titles)):
+            buckets.setdefault(signatures[titleIndex, start:start + rowsPerBand].tobytes(), []).append(titleIndex)
+
+        # Titles in the same bucket are candidates, they are only in the same cluster when they are similar enough
+        for candidates in buckets.values():
+            for i in range(1, len(candidates)):
+                for other in candidates[:i]:
+                    # Titles can share a bucket in multiple bands, they are only compared once
+                    if (other, candidates[i]) in comparedPairs or clusters.find(other) == clusters.find(candidates[i]):
+                        continue
+
+                    comparedPairs.add((other, candidates[i]))
+
+                    if jaccard(shingles[other], shingles[candidates[i]]) >= threshold:
+                        clusters.union(other, candidates[i])
+
+    titleClusters = {}
+    for titleIndex, title in enumerate(titles):
+        titleClusters.setdefault(clusters.find(titleIndex), []).append(title)
+
+    report = []
+
+    for clusterTitles in titleClusters.values():
+        clusterRows = [rows[index] for title in clusterTitles for index in titleRows[title]]
+
+        if len(clusterRows) < 2:
+            continue
+
+        keysPerFile = {}
+        for row in clusterRows:
+            keysPerFile.setdefault(row['file'], [])
+            if row['reference'] is not None and row['reference'] not in keysPerFile[row['file']]:
+                keysPerFile[row['file']].append(row['reference'])
+
+        report.append({
+            'titles': sorted(set(row['title'] for row in clusterRows)),
+            'citationKeys': sorted(set(row['reference'] for row in clusterRows if row['reference'] is not None)),
+            'files': sorted(keysPerFile),
+            'dois': sorted(set(row['doi'] for row in clusterRows if row['doi'] is not None)),
+            'keysPerFile': keysPerFile,
+            'rows': clusterRows
+        })
+
+    report.sort(key=lambda cluster: (-len(cluster['rows']), cluster['titles'][0]))
+
+    return report
+
+# Calculate the MinHash signatures of the shingle sets, returns a matrix with a row of hashes per set
+def minHashSignatures(shingleSets, hashes, seed=1):
+    generator = np.random.RandomState(seed)
+    a = generator.randint(1, MINHASH_PRIME, size=hashes, dtype=np.int64)
+    b = generator.randint(0, MINHASH_PRIME, size=hashes, dtype=np.int64)
+    signatures = np.empty((len(shingleSets), hashes), dtype=np.int64)
+
+    for index, shingles in enumerate(shingleSets):
+        shingleHashes = np.array([zlib.crc32(shingle.encode('utf-8')) % MINHASH_PRIME for shingle in shingles], dtype=np.int64)
+        signatures[index] = ((np.outer(a, shingleHashes) + b[:, None]) % MINHASH_PRIME).min(axis=1)
+
+    return signatures
+
+def jaccard(first, second):
+    return len(first & second) / len(first | second)
+
+class UnionFind:
+    def __init__(self, size):
+        self.parents = list(range(size))
+
+    def find(self, item):
+        while self.parents[item] != item:
+            self.parents[item] = self.parents[self.parents[item]]
+            item = self.parents[item]
+
+        return item
+
+    def union(self, first, second):
+        self.parents[self.find(first)] = self.find(second)
 
 if __name__ == "__main__":
     main()